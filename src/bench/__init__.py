@@ -0,0 +1,182 @@
+"""
+Benchmarks for the synthesis and event hot paths.
+
+Each benchmark times a callable with timeit and reports seconds per call.
+Results are plain dicts so they can be saved as JSON and compared between
+versions.
+"""
+import os
+import platform
+import statistics
+import time
+import timeit
+
+# audio goes nowhere so this runs on machines without a sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+
+import keyboard
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(f):
+        BENCHMARKS[name] = f
+        return f
+    return register
+
+
+def measure(f, repeat=5, min_time=.2):
+    timer = timeit.Timer(f)
+    number, _ = timer.autorange()
+    number = max(1, int(number*min_time/.2))
+    times = [t/number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+@benchmark('sin')
+def bench_sin():
+    note = keyboard.PlayerBasicNote(0, 440, 127)
+    x = keyboard.time_axis(int(note.get_duration()*44100), 44100)
+    return lambda: note.sin(x, note.f_config)
+
+
+@benchmark('additive_16')
+def bench_additive():
+    """ A 16 partial note, to compare with sin """
+    partials = [1/k for k in range(1, 17)]
+    note = keyboard.PlayerAdditiveNote(0, 440, 127, partials, sample_rate=44100)
+    x = keyboard.time_axis(int(note.get_duration()*44100), 44100)
+    return lambda: note.sin(x, note.f_config)
+
+
+def make_player(**kwargs):
+    return keyboard.Player(**kwargs)
+
+
+def bench_build_wave(voices, dtype=np.float64):
+    player = make_player(dtype=dtype)
+    notes = [keyboard.PlayerBasicNote(i, 110*2**(i/12), 127) for i in range(voices)]
+    for i, note in enumerate(notes):
+        player.start(note, i, 0)
+    return lambda: player.build_wave(voices)
+
+
+def bench_event(voices):
+    """ Starting and stopping one note with others already sounding """
+    player = make_player()
+    for i in range(voices - 1):
+        player.start(keyboard.PlayerBasicNote(i, 110*2**(i/12), 127), i, 0)
+    note = keyboard.PlayerBasicNote('event', 440, 127)
+
+    def event():
+        player.play(note, voices)
+        player.stop(note)
+    return event
+
+
+for _voices in [1, 8, 32, 88]:
+    benchmark('build_wave_{}'.format(_voices))(lambda v=_voices: bench_build_wave(v))
+    benchmark('event_{}'.format(_voices))(lambda v=_voices: bench_event(v))
+    benchmark('build_wave_{}_f32'.format(_voices))(
+        lambda v=_voices: bench_build_wave(v, np.float32))
+
+
+def synthetic_midi(events, keys=88, seed=0):
+    """ A stream of [[status, key, velocity, 0], time] with every note let go """
+    rng = np.random.default_rng(seed)
+    held = []
+    stream = []
+    for time in range(events):
+        if len(held) > 0 and (len(held) >= 10 or rng.random() < .5):
+            key = held.pop(int(rng.integers(len(held))))
+            stream.append([[128, key + 21, 0, 0], time])
+        else:
+            key = int(rng.integers(keys))
+            held.append(key)
+            stream.append([[144, key + 21, int(rng.integers(1, 128)), 0], time])
+    return stream
+
+
+@benchmark('keyboard_update')
+def bench_keyboard_update():
+    """ One midi event applied and notified through a KeyboardPlayer """
+    stream = synthetic_midi(1000)
+    board = keyboard.Keyboard()
+    keys = keyboard.KeySetBuilder().build()
+    player = keyboard.KeyboardPlayer(board, make_player(bank=keyboard.WaveBank()), keys)
+    board.watch(player)
+    events = iter([])
+
+    def update():
+        nonlocal events
+        event = next(events, None)
+        if event is None:
+            events = iter(stream)
+            event = next(events)
+        [[status, key, velocity, _], time] = event
+        if status == 144:
+            board.press(key - 21, velocity, time)
+        else:
+            board.release(key - 21)
+        board.notify()
+    return update
+
+
+NOTE_NAMES = ['C4', 'c#4', 'Db5', 'G###nn-2', 'bbb3', 'Fx6', 'A0', 'E♭2']
+
+
+@benchmark('note_parse')
+def bench_note_parse():
+    return lambda: [keyboard.Note(name) for name in NOTE_NAMES]
+
+
+@benchmark('note_calc')
+def bench_note_calc():
+    notes = [keyboard.Note(i) for i in range(88)]
+    return lambda: [note.calc_note() for note in notes]
+
+
+def run(names=None, repeat=5, min_time=.2, log=None):
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(setup(), repeat, min_time)
+        if log is not None:
+            log(name, results[name])
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(old, new, threshold=1.2):
+    """
+    Return (name, old, new, ratio) for benchmarks in both runs, and the names
+    whose median got slower than threshold times the old median.
+    """
+    rows = []
+    regressions = []
+    for name, result in new['results'].items():
+        if name not in old['results']:
+            continue
+        before = old['results'][name]['median']
+        after = result['median']
+        ratio = after/before
+        rows.append((name, before, after, ratio))
+        if ratio > threshold:
+            regressions.append(name)
+    return rows, regressions
@@ -0,0 +1,44 @@
+import json
+
+import click
+
+from . import BENCHMARKS, compare, run
+
+
+@click.command()
+@click.argument('names', nargs=-1, type=click.Choice(sorted(BENCHMARKS)))
+@click.option('--output', '-o', type=click.Path(), default=None,
+              help='Save the results as JSON.')
+@click.option('--compare', '-c', 'baseline', type=click.Path(exists=True), default=None,
+              help='Compare against results saved by an earlier run. Exits with '
+                   'status 1 if anything got slower than the threshold.')
+@click.option('--threshold', type=float, default=1.2,
+              help='Slowdown ratio that counts as a regression. 1.2 by default.')
+@click.option('--repeat', '-r', type=int, default=5,
+              help='Number of timing runs per benchmark. 5 by default.')
+@click.option('--min-time', type=float, default=.2,
+              help='Seconds each timing run should take at least. .2 by default.')
+def main(names, output, baseline, threshold, repeat, min_time):
+    """ Time the synthesis and event hot paths. """
+    def log(name, result):
+        print('{:20} {:12.3f} us'.format(name, result['median']*1e6))
+
+    results = run(names, repeat, min_time, log)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline is not None:
+        with open(baseline) as f:
+            old = json.load(f)
+        rows, regressions = compare(old, results, threshold)
+        print()
+        for name, before, after, ratio in rows:
+            flag = ' <- slower' if name in regressions else ''
+            print('{:20} {:12.3f} us {:12.3f} us {:6.2f}x{}'.format(
+                name, before*1e6, after*1e6, ratio, flag))
+        if len(regressions) > 0:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
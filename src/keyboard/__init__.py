@@ -1,13 +1,17 @@
+from .diskbank import *
+from .envelope import *
 from .keyboard import *
+from .mixer import *
 from .music import *
 from .player import *
-
-with open(os.devnull, 'w') as devnull:
-    sys.stdout = devnull
-    sys.stderr = devnull
-    import pygame
-    pygame.mixer.pre_init(frequency=44100)
-    pygame.init()
-    sys.stdout = sys.__stdout__
-    sys.stderr = sys.__stderr__
-
+from .render import *
+from .sampler import *
+from .sequencer import *
+from .sinks import *
+from .sources import *
+from .stats import *
+from .trace import *
+from .tuning import *
+from .voices import *
+from .wavebank import *
+from .wavetable import *
@@ -1,5 +1,34 @@
+import asyncio
+import os
+import signal
+
 import click
-from . import KeyboardMidi, KeyboardPlayer, Player, KeySetBuilder, Note, PlayerBasicNote
+import numpy as np
+from . import (ArrayKeyboard, KeyboardMidi, KeyboardPlayer, LatencyStats, NullSink, Player,
+               AsyncKeyboardMidi, PygameMidiSource, RecordingSource, ReplaySource, MergedSource,
+               KeySetBuilder, Note, PlayerChordNote, WaveBank, DiskWaveBank, EdoTuning,
+               ADSREnvelope, SAWTOOTH, SQUARE, TRIANGLE, OfflineRenderer, Sequencer, Sampler,
+               Profile, load_score)
+
+TIMBRES = {'sine': None, 'sawtooth': SAWTOOTH, 'square': SQUARE, 'triangle': TRIANGLE}
+
+
+def load_sampler(samples, keys, player, envelope):
+    if samples is None:
+        return None
+    try:
+        return Sampler.from_file(samples, keys, player.sample_rate, player.channels, envelope,
+                                 player.dtype)
+    except (IOError, ValueError, KeyError) as err:
+        print('Error reading samples:', err)
+        return None
+
+
+def make_envelope(adsr):
+    if adsr is None:
+        return None
+    attack, decay, sustain, release = adsr
+    return ADSREnvelope(attack/1000, decay/1000, sustain, release/1000)
 
 
 @click.group()
@@ -8,11 +37,207 @@ def main():
 
 
 @main.command()
-def keyboard():
-    keyboard_midi = KeyboardMidi()
-    player = Player()
+@click.option('--warm-up/--no-warm-up', default=False,
+              help='Render every key before listening so first presses are instant.')
+@click.option('--polyphony', '-p', type=int, default=64,
+              help='Maximum number of notes sounding at once. 64 by default.')
+@click.option('--steal', type=click.Choice(['oldest', 'quietest']), default='oldest',
+              help='Which note to cut when there are too many. oldest by default.')
+@click.option('--max-strikes', type=int, default=None,
+              help='Keep at most this many strikes of each key, using fixed size key arrays.')
+@click.option('--stats', is_flag=True,
+              help='Time each stage from midi event to sound and print latency percentiles on exit.')
+@click.option('--record', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Save the midi events that are played to this file.')
+@click.option('--input', '-i', 'inputs', type=int, multiple=True,
+              help='Read this midi input device. Repeat to play several devices at once.')
+@click.option('--replay', type=click.Path(exists=True, dir_okay=False), multiple=True,
+              help='Play midi events saved with --record instead of reading a device. '
+                   'Repeat to merge several captures, or combine with --input.')
+@click.option('--speed', type=float, default=1,
+              help='How many times faster than recorded to replay. 0 replays as fast as possible.')
+@click.option('--null-audio', is_flag=True,
+              help='Render everything but send the sound nowhere.')
+@click.option('--workers', '-w', type=int, default=None,
+              help='Render notes struck together on this many threads.')
+@click.option('--asyncio', 'use_asyncio', is_flag=True,
+              help='Wait for midi on a thread and run on an asyncio event loop instead of polling.')
+@click.option('--float32', is_flag=True,
+              help='Mix in single precision, which is faster and plenty for 16 bit output.')
+@click.option('--adsr', type=(float, float, float, float), default=None,
+              metavar='ATTACK DECAY SUSTAIN RELEASE',
+              help='Shape notes with an envelope instead of a plain fade. Attack and decay '
+                   'and release are in milliseconds, sustain is a level from 0 to 1.')
+@click.option('--timbre', type=click.Choice(['sine', 'sawtooth', 'square', 'triangle']),
+              default='sine', help='The waveform notes play. sine by default.')
+@click.option('--edo', type=int, default=None,
+              help='Tune to this many equal steps to the octave instead of 12.')
+@click.option('--scl', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Tune to a Scala scale file.')
+@click.option('--kbm', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Map keys to the degrees of --scl with a Scala keyboard mapping file.')
+@click.option('--cache', type=click.Path(file_okay=False, writable=True), default=None,
+              help='Keep rendered notes in this directory to reuse in later runs.')
+@click.option('--cache-size', type=int, default=2048,
+              help='Megabytes --cache may use before the least recently used notes are deleted.')
+@click.option('--samples', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Play WAV samples listed in this file, one "file root [low high '
+                   '[low_velocity high_velocity]]" per line, instead of --timbre.')
+@click.option('--profile', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Save a Chrome trace of each stage to this file if it ends with .json, '
+                   'else cProfile stats of the main thread. Sending the process SIGUSR1 '
+                   'pauses and resumes it.')
+def keyboard(warm_up, polyphony, steal, max_strikes, stats, record, inputs, replay, speed,
+             null_audio, workers, use_asyncio, float32, adsr, timbre, edo, scl, kbm,
+             cache, cache_size, samples, profile):
+    if scl is not None and edo is not None:
+        raise click.UsageError('--edo and --scl are different tunings, give only one.')
+    if kbm is not None and scl is None:
+        raise click.UsageError('--kbm maps the keys of a --scl tuning, give --scl with it.')
+    try:
+        if scl is not None:
+            builder = KeySetBuilder.from_scala(scl, kbm)
+        else:
+            builder = KeySetBuilder(tuning=None if edo is None else EdoTuning(edo))
+    except (IOError, ValueError, IndexError) as err:
+        print('Error reading tuning:', err)
+        return
+    envelope = make_envelope(adsr)
+    partials = TIMBRES[timbre]
+    stats = LatencyStats() if stats else None
+    if profile is not None:
+        profile = Profile(profile, stats)
+    hooks = stats if profile is None else profile.get_stats()
+    try:
+        disk = None if cache is None else DiskWaveBank(cache, cache_size*2**20)
+    except OSError as err:
+        print('Error opening cache:', err)
+        return
+    player = Player(bank=WaveBank(disk=disk), max_voices=polyphony, steal=steal, stats=hooks,
+                    sink=NullSink() if null_audio else None, workers=workers,
+                    dtype=np.float32 if float32 else np.float64)
+    sources = []
+    source = None
+    merged = None
+    try:
+        try:
+            for dev in inputs:
+                sources.append(PygameMidiSource(dev))
+            names = ['input {}'.format(dev) for dev in inputs]
+            # merged sources share a clock, the devices' if there are any
+            clock = sources[0].time if len(sources) > 0 else player.get_ticks
+            for path in replay:
+                sources.append(ReplaySource(path, speed, clock=clock))
+            names += [os.path.basename(path) for path in replay]
+            if len(sources) == 1:
+                source = sources[0]
+            elif len(sources) > 1:
+                source = merged = MergedSource(sources, names)
+            if record is not None:
+                if source is None:
+                    source = PygameMidiSource()
+                    sources.append(source)
+                source = RecordingSource(source, record)
+        except (IOError, ValueError) as err:
+            print(err)
+            return
+        wait_time = None if len(replay) > 0 and len(inputs) == 0 and not speed else 10
+        board = None if max_strikes is None else ArrayKeyboard(max_strikes=max_strikes)
+        if use_asyncio:
+            keyboard_midi = AsyncKeyboardMidi(keyboard=board, stats=hooks, source=source)
+        else:
+            keyboard_midi = KeyboardMidi(wait_time=wait_time, keyboard=board, stats=hooks,
+                                         source=source)
+        keys = builder.build()
+        sampler = load_sampler(samples, keys, player, envelope)
+        if samples is not None and sampler is None:
+            return
+        if warm_up and sampler is None:
+            player.bank.warm_up(keys, player, envelope=envelope, partials=partials)
+        keyboard_player = KeyboardPlayer(keyboard_midi, player, keys, stats=hooks,
+                                         envelope=envelope, partials=partials, sampler=sampler)
+        if profile is not None:
+            if hasattr(signal, 'SIGUSR1'):
+                signal.signal(signal.SIGUSR1, lambda *_: profile.toggle())
+            profile.start()
+        try:
+            if use_asyncio:
+                try:
+                    asyncio.run(keyboard_player.run_async())
+                except KeyboardInterrupt:
+                    print("Exiting.")
+            else:
+                keyboard_player.run()
+        finally:
+            if profile is not None:
+                profile.close()
+                print('Profile saved to', profile.path)
+        if stats is not None:
+            print(stats.report())
+            print('coalesced: {}, delayed: {}'.format(keyboard_midi.coalesced,
+                                                      keyboard_midi.delayed))
+            if merged is not None:
+                print(merged.report())
+    finally:
+        # close what was opened so pygame's midi is shut down with the last
+        # device, closing sources twice is harmless
+        for opened in sources:
+            opened.close()
+        if source is not None:
+            source.close()
+        player.close()
+
+
+@main.command()
+@click.argument('score', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Render to this WAV (or .npy) file instead of playing.')
+@click.option('--lookahead', type=int, default=100,
+              help='How many milliseconds ahead notes are scheduled. 100 by default.')
+@click.option('--polyphony', '-p', type=int, default=64,
+              help='Maximum number of notes sounding at once. 64 by default.')
+@click.option('--null-audio', is_flag=True,
+              help='Play in real time but send the sound nowhere.')
+@click.option('--adsr', type=(float, float, float, float), default=(10, 300, .5, 200),
+              metavar='ATTACK DECAY SUSTAIN RELEASE',
+              help='The envelope of the notes, times in milliseconds. 10 300 0.5 200 by default.')
+@click.option('--timbre', type=click.Choice(['sine', 'sawtooth', 'square', 'triangle']),
+              default='sine', help='The waveform notes play. sine by default.')
+@click.option('--samples', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Play WAV samples listed in this file instead of --timbre (see keyboard).')
+def play(score, output, lookahead, polyphony, null_audio, adsr, timbre, samples):
+    """
+    Play a Standard MIDI File (.mid) or a text score.
+
+    Text scores have a note per line, "time duration note [velocity]", with
+    times in milliseconds and notes like C#4.
+    """
+    try:
+        notes = load_score(score)
+    except (IOError, ValueError, IndexError) as err:
+        print('Error reading score:', err)
+        return
     keys = KeySetBuilder().build()
-    KeyboardPlayer(keyboard_midi, player, keys).run()
+    envelope = make_envelope(adsr)
+    partials = TIMBRES[timbre]
+    if output is not None:
+        renderer = OfflineRenderer(bank=WaveBank(), max_voices=polyphony)
+        sampler = load_sampler(samples, keys, renderer, envelope)
+        if samples is not None and sampler is None:
+            return
+        Sequencer(None, keys, envelope=envelope, partials=partials,
+                  sampler=sampler).render(notes, renderer)
+        renderer.write(output)
+        print('Rendered {} notes to {} at {:.1f}x real time'.format(len(notes), output,
+                                                                   renderer.speed))
+        return
+    player = Player(bank=WaveBank(), max_voices=polyphony,
+                    sink=NullSink() if null_audio else None)
+    sampler = load_sampler(samples, keys, player, envelope)
+    if samples is not None and sampler is None:
+        return
+    Sequencer(player, keys, lookahead, envelope, partials, sampler).play(notes)
+    player.close()
 
 
 @main.command()
@@ -104,48 +329,52 @@ def note(notes, root_note, root_freq, play_note, play_minor_third,
         parsed_notes.append(_note)
     keyset = KeySetBuilder(root_freq, root_note.get_key()).build()
 
-    for _note in parsed_notes:
-        freq = keyset.get_freq(_note.get_key())
-        to_play = []
-        if play_note:
-            to_play.append(freq)
-        if play_minor_third:
-            to_play.append(freq*6/5)
-        if play_major_third:
-            to_play.append(freq*5/4)
-        if play_fourth:
-            to_play.append(freq*4/3)
-        if play_fifth:
-            to_play.append(freq*3/2)
-        if play_octave:
-            to_play.append(freq*2)
-        for ratio in play_ratio:
-            to_play.append(freq*ratio[0]/ratio[1])
-
-        play(_note, freq, to_play, duration, play_separate, play_chord, fade_note)
-
-
-def play(curr_note, base_freq, to_play, duration, play_separate, play_chord, fade_note):
+    ratios = []
+    if play_note:
+        ratios.append(1)
+    if play_minor_third:
+        ratios.append(6/5)
+    if play_major_third:
+        ratios.append(5/4)
+    if play_fourth:
+        ratios.append(4/3)
+    if play_fifth:
+        ratios.append(3/2)
+    if play_octave:
+        ratios.append(2)
+    for ratio in play_ratio:
+        ratios.append(ratio[0]/ratio[1])
+
+    player = Player()
+    freqs = keyset.get_freqs([_note.get_key() for _note in parsed_notes])
+    for _note, freq in zip(parsed_notes, freqs):
+        play_intervals(player, _note, freq, freq*np.array(ratios), duration, play_separate,
+                       play_chord, fade_note)
+    player.close()
+
+
+def play_intervals(player, curr_note, base_freq, to_play, duration, play_separate,
+                   play_chord, fade_note):
     print('Base note: {} at {} hz'.format(curr_note, base_freq))
     print('Playing:')
     volume = 127
     for freq in to_play:
         print('{} hz ({} ratio)'.format(freq, freq/base_freq))
     print()
-    player = Player()
+    if len(to_play) == 0:
+        return
+    # nothing plays past duration, so there's no need to render further
+    chord = PlayerChordNote(float(base_freq), to_play, volume, fade=fade_note,
+                            duration=duration/1000)
     if play_separate:
-        for freq in to_play:
-            _note = PlayerBasicNote((freq, 0), freq, volume, fade=fade_note)
+        for _note in chord.split(player.sub_x(chord.get_duration())):
             player.play(_note)
             player.delay(duration)
             player.stop(_note)
     if play_chord:
-        notes = []
-        for freq in to_play:
-            notes.append(PlayerBasicNote((freq, 1), freq, volume, fade=fade_note))
-        player.play_all(notes)
+        player.play(chord)
         player.delay(duration)
-        player.stop_all(notes)
+        player.stop(chord)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,50 @@
+"""
+pygame is only imported and initialised once something needs audio or midi,
+so that importing the package, using Note and KeySet or asking the cli for
+help doesn't pay for SDL's startup.
+"""
+import os
+import sys
+
+
+def load_pygame():
+    """ Import pygame without its banner """
+    if 'pygame' in sys.modules:
+        return sys.modules['pygame']
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        sys.stderr = devnull
+        try:
+            import pygame
+        finally:
+            sys.stdout = sys.__stdout__
+            sys.stderr = sys.__stderr__
+    return pygame
+
+
+def init_pygame(frequency=44100):
+    pygame = load_pygame()
+    if not pygame.get_init():
+        pygame.mixer.pre_init(frequency=frequency)
+        pygame.init()
+    return pygame
+
+
+def init_mixer(frequency=44100):
+    pygame = init_pygame(frequency)
+    import pygame.sndarray
+    return pygame
+
+
+def init_midi():
+    pygame = init_pygame()
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        sys.stderr = devnull
+        try:
+            import pygame.midi
+        finally:
+            sys.stdout = sys.__stdout__
+            sys.stderr = sys.__stderr__
+    pygame.midi.init()
+    return pygame
@@ -0,0 +1,106 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+class DiskWaveBank:
+    """
+    Rendered waves saved as .npy files under path so that they outlive the
+    process, for use as a WaveBank's store.
+
+    Waves are opened memory mapped and read only, so voices read them
+    straight out of the OS's page cache without copying, and a program
+    started with a warm cache renders nothing.
+
+    Files are named by a hash of the wave key, which holds everything a wave
+    depends on: the note type, its frequency (so the tuning), volume layer,
+    envelope and duration, plus the sample rate and dtype. VERSION goes into
+    the hash too and is bumped whenever rendering changes, so stale files are
+    never read. Files that can't be read are deleted. Once the files add up
+    to more than max_bytes, the least recently used are deleted.
+    """
+    VERSION = 1
+    SUFFIX = '.npy'
+
+    def __init__(self, path, max_bytes=2*2**30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+        self.files = OrderedDict()
+        self.size = 0
+        self.scan()
+
+    def __len__(self):
+        return len(self.files)
+
+    def scan(self):
+        """ Find the files already in path, least recently used first """
+        found = []
+        for entry in os.scandir(self.path):
+            if entry.is_file() and entry.name.endswith(DiskWaveBank.SUFFIX):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        self.files.clear()
+        self.size = 0
+        for _, name, size in sorted(found):
+            self.files[name] = size
+            self.size += size
+
+    def get_name(self, key):
+        text = repr((DiskWaveBank.VERSION,) + tuple(key))
+        return hashlib.sha1(text.encode()).hexdigest() + DiskWaveBank.SUFFIX
+
+    def get(self, key):
+        """ Return the wave stored for key memory mapped, or None """
+        name = self.get_name(key)
+        if name not in self.files:
+            self.misses += 1
+            return None
+        path = os.path.join(self.path, name)
+        try:
+            wave = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (OSError, ValueError):
+            self.remove(name)
+            self.misses += 1
+            return None
+        self.files.move_to_end(name)
+        self.hits += 1
+        return wave
+
+    def put(self, key, wave):
+        """ Save wave under key and return it memory mapped from the file """
+        name = self.get_name(key)
+        path = os.path.join(self.path, name)
+        # written to the side and renamed so readers never see half a file
+        partial = '{}.{}.tmp'.format(path, os.getpid())
+        with open(partial, 'wb') as f:
+            np.save(f, np.ascontiguousarray(wave))
+        os.replace(partial, path)
+        if name in self.files:
+            self.size -= self.files.pop(name)
+        self.files[name] = os.path.getsize(path)
+        self.size += self.files[name]
+        self.evict()
+        if name not in self.files:
+            return wave
+        return np.load(path, mmap_mode='r')
+
+    def remove(self, name):
+        self.size -= self.files.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        while self.size > self.max_bytes and len(self.files) > 0:
+            self.remove(next(iter(self.files)))
+
+    def clear(self):
+        for name in list(self.files):
+            self.remove(name)
@@ -0,0 +1,101 @@
+"""
+Envelopes shape a note's level over time.
+
+levels(t) is the level t seconds into a held note and release_levels(t,
+level) the level t seconds after letting go of a note that was at level.
+Both work on arrays. Levels under threshold can't be heard, so notes stop
+rendering once their envelope gets there and voices are retired then.
+"""
+import numpy as np
+
+# -80 dB, under one step of 16 bit output at the player's volume
+SILENCE = 1e-4
+
+
+class Envelope:
+    """
+    Holds at full level and, with a release, fades out exponentially with a
+    time constant of release seconds once let go of. Without one, notes stop
+    as soon as they are let go of.
+    """
+
+    def __init__(self, release=0, threshold=SILENCE):
+        self.release = release
+        self.threshold = threshold
+
+    def get_key(self):
+        return (type(self), self.release, self.threshold)
+
+    def levels(self, t):
+        return np.ones_like(np.asarray(t, dtype=np.float64))
+
+    def get_hold_time(self, level=1):
+        """
+        Return how long a held note at level lasts before it can't be heard,
+        or None if it never fades out.
+        """
+        return None
+
+    def release_levels(self, t, level):
+        t = np.asarray(t, dtype=np.float64)
+        if self.release <= 0:
+            return np.zeros_like(t)
+        return level*np.exp(-t/self.release)
+
+    def get_release_time(self, level):
+        """ Return how long a note let go of at level takes to fade out """
+        if self.release <= 0 or level <= self.threshold:
+            return 0
+        return self.release*np.log(level/self.threshold)
+
+
+class ExpEnvelope(Envelope):
+    """ Decays from the start with a time constant of time_constant seconds """
+
+    def __init__(self, time_constant=.5, release=0, threshold=SILENCE):
+        super().__init__(release, threshold)
+        self.time_constant = time_constant
+
+    def get_key(self):
+        return super().get_key() + (self.time_constant,)
+
+    def levels(self, t):
+        return np.exp(-np.asarray(t, dtype=np.float64)/self.time_constant)
+
+    def get_hold_time(self, level=1):
+        if level <= self.threshold:
+            return 0
+        return self.time_constant*np.log(level/self.threshold)
+
+
+class ADSREnvelope(Envelope):
+    """
+    Rises linearly to full level over attack seconds, then falls towards the
+    sustain level with a time constant of decay seconds and stays there until
+    let go of.
+    """
+
+    def __init__(self, attack=.01, decay=.3, sustain=.5, release=.2, threshold=SILENCE):
+        super().__init__(release, threshold)
+        self.attack = attack
+        self.decay = decay
+        self.sustain = sustain
+
+    def get_key(self):
+        return super().get_key() + (self.attack, self.decay, self.sustain)
+
+    def levels(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        rise = np.minimum(t/self.attack, 1) if self.attack > 0 else 1
+        if self.decay <= 0:
+            return rise*self.sustain
+        fall = np.exp(-np.maximum(t - self.attack, 0)/self.decay)
+        return rise*(self.sustain + (1 - self.sustain)*fall)
+
+    def get_hold_time(self, level=1):
+        if self.sustain*level > self.threshold:
+            return None
+        if self.decay <= 0 or level <= self.threshold:
+            return self.attack
+        ratio = (1 - self.sustain)/(self.threshold/level - self.sustain)
+        return self.attack + self.decay*np.log(ratio)
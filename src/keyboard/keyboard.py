@@ -1,51 +1,116 @@
-import sys
-import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
 
-with open(os.devnull, 'w') as devnull:
-    sys.stdout = devnull
-    sys.stderr = devnull
-    import pygame
-    import pygame.midi
-    sys.stdout = sys.__stdout__
-    sys.stderr = sys.__stderr__
+import numpy as np
+
+from .sources import PygameMidiSource
 
 
 class KeyboardMidi:
-    def __init__(self, verbose=False, wait_time=10):
-        self.input = None
+    """
+    Reads midi events from a source into a Keyboard. The source is the
+    default midi device unless one is given (see MidiSource).
+
+    Every loop drains everything waiting on the source, batch_size events at
+    a time, and applies it in timestamp order. Runs of sustain messages that
+    don't change the pedal are dropped. coalesced counts the dropped
+    messages and delayed counts messages that arrived after a later one.
+    """
+    CONTROLLER_STATUSES = (176, 177)
+
+    def __init__(self, verbose=False, wait_time=10, batch_size=64, keyboard=None,
+                 stats=None, source=None):
+        self.source = source
         self.listening = False
-        self.dev = None
         self.verbose = verbose
         self.wait_time = wait_time
-        self.keyboard = Keyboard()
-
-        pygame.midi.init()
-        pygame.fastevent.init()
-
-    def check_dev(self):
-        if self.dev == -1:
-            raise IOError("No Midi device found")
+        self.batch_size = batch_size
+        self.keyboard = Keyboard() if keyboard is None else keyboard
+        self.coalesced = 0
+        self.delayed = 0
+        self.stats = stats
+        self.read_time = 0
+        self.read_started = None
 
     def listen(self):
         self.listening = True
-        self.dev = pygame.midi.get_default_input_id()
-        self.check_dev()
-        self.input = pygame.midi.Input(self.dev)
+        if self.source is None:
+            self.source = PygameMidiSource()
         try:
-            while self.listening:
+            while self.listening and not self.source.done():
                 self.loop()
-        except KeyboardInterrupt:
-            self.input.close()
-            raise
+        finally:
+            self.source.close()
 
     def loop(self):
-        if self.input.poll():
-            midi_events = self.input.read(10)
-            for e in midi_events:
-                self.handle_event(e)
+        midi_events = self.read_all()
+        if len(midi_events) > 0:
+            self.process(midi_events)
         self.keyboard.notify()
+        if self.stats is not None:
+            self.stats.end()
         if self.wait_time is not None:
-            pygame.time.wait(self.wait_time)
+            sleep(self.wait_time/1000)
+
+    def process(self, midi_events):
+        """ Apply events to the keyboard, returning them in the order applied """
+        if self.stats is not None:
+            self.time_waits(midi_events)
+        midi_events, coalesced, delayed = self.order_events(midi_events)
+        self.coalesced += coalesced
+        self.delayed += delayed
+        for e in midi_events:
+            self.handle_event(e)
+        return midi_events
+
+    def read_all(self):
+        if self.stats is not None:
+            self.read_started = perf_counter()
+        midi_events = []
+        while self.source.poll():
+            midi_events.extend(self.source.read(self.batch_size))
+        if self.stats is not None:
+            self.read_time = perf_counter() - self.read_started
+        return midi_events
+
+    def time_waits(self, midi_events):
+        now = self.source.time()
+        waits = [max(now - time, 0)/1000 for _, time in midi_events]
+        for wait in waits:
+            self.stats.record('wait', wait)
+        self.stats.begin(max(waits))
+        self.stats.record('read', self.read_time, self.read_started)
+
+    @staticmethod
+    def order_events(midi_events):
+        """
+        Sort events by timestamp and drop sustain messages that repeat the
+        pedal's state. Returns the events with how many were dropped and how
+        many arrived out of order.
+        """
+        delayed = 0
+        latest = None
+        for _, time in midi_events:
+            if latest is not None and time < latest:
+                delayed += 1
+            else:
+                latest = time
+        midi_events = sorted(midi_events, key=lambda e: e[1])
+
+        ordered = []
+        pedal = None
+        for e in midi_events:
+            status, _, velocity, _ = e[0]
+            if status in KeyboardMidi.CONTROLLER_STATUSES:
+                down = velocity == 127
+                if down == pedal:
+                    continue
+                pedal = down
+            else:
+                pedal = None
+            ordered.append(e)
+        return ordered, len(midi_events) - len(ordered), delayed
 
     def handle_event(self, event):
         [[status, key, velocity, _], time] = event
@@ -53,7 +118,7 @@ class KeyboardMidi:
             self.keyboard.press(key-21, velocity, time)
         elif status == 128:
             self.keyboard.release(key-21)
-        elif status == 176 or status == 177:
+        elif status in KeyboardMidi.CONTROLLER_STATUSES:
             if velocity == 127:
                 self.keyboard.press_sustain()
             else:
@@ -64,9 +129,102 @@ class KeyboardMidi:
     def watch(self, observer):
         self.keyboard.watch(observer)
 
-    def __del__(self):
-        pygame.midi.quit()
-        pygame.quit()
+
+class AsyncKeyboardMidi(KeyboardMidi):
+    """
+    A KeyboardMidi for asyncio.
+
+    Sources don't block, so waiting for input runs on a thread that checks
+    the source every poll_time ms, leaving the event loop free for other
+    tasks until events arrive. Each batch is applied like KeyboardMidi.loop
+    does, then observers are notified and async observers, whose update is a
+    coroutine, are awaited together.
+
+    Iterating with async for applies events and yields each one in the order
+    it was applied. listen() does the same, throwing the events away.
+    """
+
+    def __init__(self, verbose=False, poll_time=1, batch_size=64, keyboard=None,
+                 stats=None, source=None):
+        super().__init__(verbose, None, batch_size, keyboard, stats, source)
+        self.poll_time = poll_time
+        self.async_observers = set()
+
+    def watch_async(self, observer):
+        self.async_observers.add(observer)
+
+    def wait_events(self):
+        """ Block until there are events or the source is done, and read them """
+        while self.listening and not self.source.done():
+            midi_events = self.read_all()
+            if len(midi_events) > 0:
+                return midi_events
+            sleep(self.poll_time/1000)
+        return []
+
+    async def notify(self):
+        changes = self.keyboard.notify()
+        if self.stats is not None:
+            self.stats.end()
+        if changes is not None and len(self.async_observers) > 0:
+            await asyncio.gather(*(observer.update(self.keyboard, changes)
+                                   for observer in self.async_observers))
+
+    async def events(self):
+        self.listening = True
+        if self.source is None:
+            self.source = PygameMidiSource()
+        loop = asyncio.get_running_loop()
+        # sources aren't thread safe, so they are only read from one thread
+        executor = ThreadPoolExecutor(1)
+        try:
+            while self.listening and not self.source.done():
+                midi_events = await loop.run_in_executor(executor, self.wait_events)
+                if len(midi_events) == 0:
+                    continue
+                midi_events = self.process(midi_events)
+                await self.notify()
+                for e in midi_events:
+                    yield e
+        finally:
+            self.listening = False
+            executor.shutdown()
+            self.source.close()
+
+    def __aiter__(self):
+        return self.events()
+
+    async def listen(self):
+        async for _ in self:
+            pass
+
+    def stop(self):
+        self.listening = False
+
+
+class KeyboardChanges:
+    """
+    What happened on a Keyboard since observers were last notified.
+
+    * pressed: (key, velocity, time) for each new strike, in order
+    * released: keys whose strikes were all let go
+    * sustained: keys let go while the sustain pedal holds them
+    * dropped: (key, velocity, time) of old strikes pushed out to make room
+      for new ones
+
+    Observers should apply released and dropped before pressed, since a key
+    can be let go and struck again between two notifications.
+    """
+
+    def __init__(self):
+        self.pressed = []
+        self.released = set()
+        self.sustained = set()
+        self.dropped = []
+
+    def __bool__(self):
+        return bool(self.pressed or self.released or self.sustained
+                    or self.dropped)
 
 
 class Keyboard:
@@ -74,6 +232,7 @@ class Keyboard:
         self.keys = {}
         self.sustain = None
         self.observers = set()
+        self.changes = KeyboardChanges()
 
     def press_sustain(self):
         if self.sustain is not None:
@@ -85,7 +244,7 @@ class Keyboard:
             return
         for key, value in self.sustain.items():
             if value:
-                self.keys[key] = []
+                self.clear(key)
         self.sustain = None
 
     def press(self, key, velocity, time):
@@ -94,17 +253,143 @@ class Keyboard:
         if key not in self.keys:
             self.keys[key] = []
         self.keys[key].append((velocity, time))
+        self.changes.pressed.append((key, velocity, time))
+        self.changes.sustained.discard(key)
 
     def release(self, key):
         if self.sustain is not None:
             self.sustain[key] = True
+            self.changes.sustained.add(key)
         else:
-            self.keys[key] = []
+            self.clear(key)
+
+    def clear(self, key):
+        self.keys[key] = []
+        pressed = self.changes.pressed
+        if any(k == key for k, _, _ in pressed):
+            # never notified, so observers never need to hear about them
+            self.changes.pressed = [p for p in pressed if p[0] != key]
+        self.changes.released.add(key)
+        self.changes.sustained.discard(key)
 
     def notify(self):
+        """
+        Tell observers what changed since the last call, and return it. Nothing
+        is called if nothing changed.
+        """
+        if not self.changes:
+            return None
+        changes = self.changes
+        self.changes = KeyboardChanges()
         for observer in self.observers:
-            observer.update(self)
+            observer.update(self, changes)
+        return changes
 
     def watch(self, observer):
         self.observers.add(observer)
 
+
+class ArrayKeyboard(Keyboard):
+    """
+    A Keyboard whose state lives in fixed size arrays.
+
+    pressed and sustained are flags per key, velocity and onset hold each
+    key's last strike, and each key keeps at most max_strikes strikes in a
+    ring. Striking a key with a full ring drops its oldest strike. Memory
+    stays the same no matter how long the pedal is held, and keys outside
+    [0, num_keys) are ignored.
+    """
+
+    def __init__(self, num_keys=88, max_strikes=8):
+        self.num_keys = num_keys
+        self.max_strikes = max_strikes
+        self.pedal = False
+        self.pressed = np.zeros(num_keys, dtype=bool)
+        self.sustained = np.zeros(num_keys, dtype=bool)
+        self.velocity = np.zeros(num_keys, dtype=np.uint8)
+        self.onset = np.zeros(num_keys, dtype=np.float64)
+        self.strike_velocity = np.zeros((num_keys, max_strikes), dtype=np.uint8)
+        self.strike_time = np.zeros((num_keys, max_strikes), dtype=np.float64)
+        self.strike_head = np.zeros(num_keys, dtype=np.intp)
+        self.strike_count = np.zeros(num_keys, dtype=np.intp)
+        self.observers = set()
+        self.changes = KeyboardChanges()
+
+    @property
+    def keys(self):
+        """ The strikes of every sounding key, oldest first, like Keyboard.keys """
+        return {int(key): self.get_strikes(key) for key in self.active_keys()}
+
+    def active_keys(self):
+        return np.flatnonzero(self.strike_count)
+
+    def sounding(self):
+        return self.pressed | self.sustained
+
+    def get_strikes(self, key):
+        count = self.strike_count[key]
+        first = self.strike_head[key] - count
+        slots = np.arange(first, first + count) % self.max_strikes
+        return list(zip(self.strike_velocity[key, slots].tolist(),
+                        self.strike_time[key, slots].tolist()))
+
+    def in_range(self, key):
+        return 0 <= key < self.num_keys
+
+    def press_sustain(self):
+        self.pedal = True
+
+    def release_sustain(self):
+        if not self.pedal:
+            return
+        for key in np.flatnonzero(self.sustained):
+            self.clear(key)
+        self.pedal = False
+
+    def press(self, key, velocity, time):
+        if not self.in_range(key):
+            return
+        self.sustained[key] = False
+        self.pressed[key] = True
+        self.velocity[key] = velocity
+        self.onset[key] = time
+        head = self.strike_head[key]
+        if self.strike_count[key] == self.max_strikes:
+            self.drop(key, (int(self.strike_velocity[key, head]),
+                            float(self.strike_time[key, head])))
+        else:
+            self.strike_count[key] += 1
+        self.strike_velocity[key, head] = velocity
+        self.strike_time[key, head] = time
+        self.strike_head[key] = (head + 1) % self.max_strikes
+        self.changes.pressed.append((key, velocity, time))
+        self.changes.sustained.discard(key)
+
+    def drop(self, key, strike):
+        strike = (key,) + strike
+        pressed = self.changes.pressed
+        if strike in pressed:
+            pressed.remove(strike)
+        else:
+            self.changes.dropped.append(strike)
+
+    def release(self, key):
+        if not self.in_range(key):
+            return
+        self.pressed[key] = False
+        if self.pedal:
+            self.sustained[key] = True
+            self.changes.sustained.add(key)
+        else:
+            self.clear(key)
+
+    def clear(self, key):
+        key = int(key)
+        self.sustained[key] = False
+        self.strike_count[key] = 0
+        pressed = self.changes.pressed
+        if any(k == key for k, _, _ in pressed):
+            self.changes.pressed = [p for p in pressed if p[0] != key]
+        self.changes.dropped = [d for d in self.changes.dropped if d[0] != key]
+        self.changes.released.add(key)
+        self.changes.sustained.discard(key)
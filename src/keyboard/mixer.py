@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class Mixer:
+    """
+    A running mix of every sounding voice.
+
+    Positions are in samples. Adding or removing a voice only touches that
+    voice's samples from the playhead onward, so the cost of an event doesn't
+    grow with the number of voices already sounding.
+
+    Samples before the playhead can no longer be heard and are dropped the
+    next time the buffer has to grow. The buffer is mixed in dtype and kept
+    when the last voice is removed, so a quiet keyboard doesn't reallocate.
+    """
+
+    def __init__(self, channels, dtype=np.float64):
+        self.channels = channels
+        self.voices = {}
+        self.buffer = np.zeros((0, channels), dtype=dtype)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return len(self.voices)
+
+    def __contains__(self, voice):
+        return voice in self.voices
+
+    def reset(self, now):
+        """ Silence the buffer and start it at now """
+        self.buffer[:self.end-self.start, :] = 0
+        self.start = now
+        self.end = now
+
+    def add(self, voice, wave, begin, now):
+        """
+        Mix wave into the buffer with its first sample at begin. Only the
+        part of the wave at or after now is mixed.
+        """
+        if voice in self.voices:
+            self.remove(voice, now)
+        self.voices[voice] = (begin, wave)
+        self.mix(wave, begin, now, 1)
+
+    def add_all(self, voices, now, executor=None, chunks=1):
+        """
+        Mix (voice, wave, begin) for each of voices. With an executor, the
+        samples are split into chunks that are summed on its threads, each
+        chunk adding every voice that overlaps it.
+        """
+        for voice, wave, begin in voices:
+            if voice in self.voices:
+                self.remove(voice, now)
+            self.voices[voice] = (begin, wave)
+        if executor is None or chunks < 2:
+            for voice, wave, begin in voices:
+                self.mix(wave, begin, now, 1)
+            return
+        now = max(now, self.start)
+        end = max([begin + wave.shape[0] for _, wave, begin in voices], default=now)
+        if end <= now:
+            return
+        self.reserve(now, end)
+        bounds = np.linspace(now, end, chunks + 1).astype(int)
+        jobs = [executor.submit(self.mix_range, voices, low, high)
+                for low, high in zip(bounds[:-1], bounds[1:])]
+        for job in jobs:
+            job.result()
+
+    def mix_range(self, voices, low, high):
+        """ Add the samples of voices that fall in [low, high) """
+        for _, wave, begin in voices:
+            first = max(low, begin)
+            last = min(high, begin + wave.shape[0])
+            if last > first:
+                self.buffer[first-self.start:last-self.start, :] += wave[first-begin:last-begin, :]
+
+    def remove(self, voice, now):
+        """
+        Take the rest of the voice's wave back out of the mix from now on.
+        """
+        if voice not in self.voices:
+            return
+        begin, wave = self.voices.pop(voice)
+        if len(self.voices) == 0:
+            # silence instead of carrying rounding errors, keeping what is
+            # before now in case now is ahead of the playhead
+            now = max(now, self.start)
+            self.buffer[now-self.start:self.end-self.start, :] = 0
+            self.end = min(self.end, now)
+        else:
+            self.mix(wave, begin, now, -1)
+            self.end = max(begin + wave.shape[0]
+                           for begin, wave in self.voices.values())
+
+    def mix(self, wave, begin, now, sign):
+        now = max(now, self.start)
+        first = max(now, begin)
+        end = begin + wave.shape[0]
+        if end <= first:
+            return
+        self.reserve(now, end)
+        target = self.buffer[first-self.start:end-self.start, :]
+        if sign > 0:
+            target += wave[first-begin:, :]
+        else:
+            target -= wave[first-begin:, :]
+
+    def reserve(self, now, end):
+        """
+        Make sure the buffer reaches end, dropping anything before now if it
+        has to be reallocated.
+        """
+        self.end = max(self.end, end)
+        if end - self.start <= self.buffer.shape[0]:
+            return
+        keep = self.buffer[now-self.start:self.end-self.start, :]
+        size = (self.end - now)*3//2
+        buffer = np.zeros((size, self.channels), dtype=self.buffer.dtype)
+        buffer[:keep.shape[0], :] = keep
+        self.buffer = buffer
+        self.start = now
+
+    def read(self, now):
+        """
+        Return a view of the mix from now until the last voice ends.
+        """
+        now = max(now, self.start)
+        return self.buffer[now-self.start:max(now, self.end)-self.start, :]
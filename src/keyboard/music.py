@@ -1,31 +1,92 @@
 import re
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from .tuning import EdoTuning, KeyMapping, RatioTuning
 
 
 class KeySetBuilder:
+    """
+    Works out the frequency of every key from a tuning.
+
+    root is the frequency of key root_index. tuning defaults to
+    keys_per_octave equal steps to the octave, and mapping, a KeyMapping,
+    chooses which scale degree each key plays when keys and degrees don't
+    line up one to one. Tables are cached by everything that goes into them,
+    so building the same tuning twice returns the same read only array. The
+    last max_tables tables built are kept.
+    """
+    tables = OrderedDict()
+    max_tables = 64
+
     def __init__(self,
                  root=440,
                  root_index=48,
                  num_keys=88,
-                 keys_per_octave=12):
+                 keys_per_octave=12,
+                 tuning=None,
+                 mapping=None):
         self.root = root
         self.root_index = root_index
         self.num_keys = num_keys
         self.keys_per_octave = keys_per_octave
+        self.tuning = EdoTuning(keys_per_octave) if tuning is None else tuning
+        self.mapping = mapping
+
+    @classmethod
+    def from_scala(cls, scl_path, kbm_path=None, num_keys=88):
+        """ Build from a Scala scale and, optionally, keyboard mapping """
+        tuning = RatioTuning.from_scl(scl_path)
+        mapping = KeyMapping() if kbm_path is None else KeyMapping.from_kbm(kbm_path)
+        return cls(mapping.reference_freq, mapping.reference_key, num_keys,
+                   tuning.size, tuning, mapping)
+
+    def get_key(self):
+        mapping = None if self.mapping is None else self.mapping.get_key()
+        return (self.root, self.root_index, self.num_keys, self.tuning.get_key(), mapping)
 
     def build_keys(self):
-        return [self.get_freq(i) for i in range(self.num_keys)]
+        key = self.get_key()
+        tables = KeySetBuilder.tables
+        keys = tables.get(key)
+        if keys is not None:
+            tables.move_to_end(key)
+            return keys
+        keys = self.get_freqs(np.arange(self.num_keys))
+        keys.flags.writeable = False
+        tables[key] = keys
+        while len(tables) > KeySetBuilder.max_tables:
+            tables.popitem(last=False)
+        return keys
+
+    def get_degrees(self, keys):
+        keys = np.asarray(keys)
+        if self.mapping is None:
+            return (keys - self.root_index).astype(np.float64)
+        return self.mapping.degrees(keys, self.tuning.size)
+
+    def get_freqs(self, keys):
+        """ The frequencies of keys, nan for keys that don't play """
+        reference = self.tuning.ratios(self.get_degrees([self.root_index]))[0]
+        return self.root * self.tuning.ratios(self.get_degrees(keys)) / reference
 
     def get_freq(self, key):
-        steps = (key-self.root_index)/self.keys_per_octave
-        ratio = 2**steps
-        return self.root * ratio
+        return float(self.get_freqs([key])[0])
 
     def build(self):
         return KeySet(self, True)
 
 
 class KeySet:
-    standard = []
+    """
+    The frequency of each key, as an array indexed by key.
+
+    retune swaps in the table of another builder, so a keyboard that is
+    playing picks up the new tuning on its next press.
+    """
+    standard = KeySetBuilder().build_keys()
 
     def __init__(self, builder=None, build=True):
         self.keys = None
@@ -40,7 +101,16 @@ class KeySet:
         if self.keys is None:
             return self.builder.get_freq(key)
         else:
-            return self.keys[key]
+            return float(self.keys[key])
+
+    def get_freqs(self, keys):
+        if self.keys is None:
+            return self.builder.get_freqs(keys)
+        return self.keys[np.asarray(keys, dtype=np.intp)]
+
+    def retune(self, builder):
+        self.keys = builder.build_keys()
+        self.builder = builder
 
 
 class Note:
@@ -73,6 +143,21 @@ class Note:
         FLAT: -1,
     }
 
+    # derived tables, built once
+    VALUE_TO_NOTE = {value: note for note, value in NOTE_VALUES.items()}
+    SYMBOL_VALUES = {
+        **dict.fromkeys(SHARPS, 1),
+        **dict.fromkeys(DOUBLE_SHARPS, 2),
+        **dict.fromkeys(NATURALS, 0),
+        **dict.fromkeys(FLATS, -1),
+    }
+    SHARP_NAMES = ['C', 'C' + SHARP, 'D', 'D' + SHARP, 'E', 'F', 'F' + SHARP,
+                   'G', 'G' + SHARP, 'A', 'A' + SHARP, 'B']
+    FLAT_NAMES = ['C', 'D' + FLAT, 'D', 'E' + FLAT, 'E', 'F', 'G' + FLAT,
+                  'G', 'A' + FLAT, 'A', 'B' + FLAT, 'B']
+    NOTE_REGEX = re.compile('([A-Ga-g])([{}]*)([-]?[0-9]+)'.format(
+        SHARPS + DOUBLE_SHARPS + NATURALS + FLATS))
+
     def __init__(self, note, use_flats=False):
         self.use_flats = use_flats
         if isinstance(note, str):
@@ -105,21 +190,48 @@ class Note:
         return self.key
 
     def parse_note(self, note):
-        letter, accidentals, octave = self.parse_note_groups(note)
-        letter = letter.upper()
-        accidentals = self.reformat_accidentals(accidentals)
-        return letter, accidentals, octave
+        return self.parse_name(note)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def parse_name(note):
+        """
+        Return (letter, accidentals, octave) for a note name, with the
+        accidentals simplified. Results are memoized.
+        """
+        letter, accidentals, octave = Note.parse_note_groups(note)
+        return letter.upper(), Note.simplify_accidentals(accidentals), octave
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def name_to_key(note):
+        return Note.note_to_key(Note.parse_name(note))
 
     @staticmethod
     def parse_note_groups(note):
-        note_regex = '([A-Ga-g])([{}]*)([-]?[0-9]+)'
-        accidentals = Note.SHARPS + Note.DOUBLE_SHARPS + Note.NATURALS + Note.FLATS
-        note_regex = note_regex.format(accidentals)
-        m = re.search(note_regex, note)
+        m = Note.NOTE_REGEX.search(note)
         if m is None:
             raise ValueError("Invalid note format: {}".format(note))
         return m.groups()
 
+    @classmethod
+    def parse_many(cls, names, use_flats=False):
+        return [cls(name, use_flats) for name in names]
+
+    @staticmethod
+    def keys_from_names(names):
+        """ Return the keys of note names as an integer array """
+        return np.fromiter((Note.name_to_key(name) for name in names),
+                           dtype=np.int64, count=len(names))
+
+    @staticmethod
+    def names_from_keys(keys, use_flats=False):
+        """ Return the simplest name of each key, the reverse of keys_from_names """
+        keys = np.asarray(keys, dtype=np.int64) + 9  # undo A0 adjustment
+        names = Note.FLAT_NAMES if use_flats else Note.SHARP_NAMES
+        return [names[value] + str(octave)
+                for value, octave in zip((keys % 12).tolist(), (keys // 12).tolist())]
+
     @staticmethod
     def replace_any(value, old_set, new):
         for old in old_set:
@@ -127,14 +239,12 @@ class Note:
         return value
 
     def reformat_accidentals(self, accidentals):
-        accidentals = self.replace_any(accidentals, Note.SHARPS, Note.SHARP)
-        accidentals = self.replace_any(accidentals, Note.DOUBLE_SHARPS, Note.DOUBLE_SHARP)
-        accidentals = self.replace_any(accidentals, Note.FLATS, Note.FLAT)
-        accidentals = self.replace_any(accidentals, Note.NATURALS, Note.NATURAL)
-        value = 0
-        for accidental in accidentals:
-            value += Note.ACCIDENTAL_VALUES[accidental]
-        return self.value_to_accidental(value)
+        return self.simplify_accidentals(accidentals)
+
+    @staticmethod
+    def simplify_accidentals(accidentals):
+        value = sum(Note.SYMBOL_VALUES[symbol] for symbol in accidentals)
+        return Note.value_to_accidental(value)
 
     @staticmethod
     def value_to_accidental(value):
@@ -146,7 +256,11 @@ class Note:
             return Note.DOUBLE_SHARP*(value // 2) + Note.SHARP*(value % 2)
 
     def calc_key(self):
-        note, accidentals, octave = self.note
+        return self.note_to_key(self.note)
+
+    @staticmethod
+    def note_to_key(note):
+        note, accidentals, octave = note
         value = Note.NOTE_VALUES[note]  # get note value
         for accidental in accidentals:
             value += Note.ACCIDENTAL_VALUES[accidental]  # add accidentals
@@ -165,7 +279,7 @@ class Note:
         value = self.key
         value += 9  # undo A0 adjustment
         octave = str(value // 12)
-        value_to_note = {value: key for key, value in Note.NOTE_VALUES.items()}
+        value_to_note = Note.VALUE_TO_NOTE
         note_value = value % 12
         if note_value not in value_to_note:
             if use_flats:
@@ -1,6 +1,44 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from math import isnan
+
 import numpy as np
-import pygame
-import pygame.sndarray
+
+from .envelope import ExpEnvelope
+from .mixer import Mixer
+from .sinks import PygameSink
+from .voices import VoicePool
+from .wavetable import band_limit, harmonic_table, read_table
+
+
+def time_axis(length, sample_rate, offset=0):
+    x = np.arange(offset, offset+length, dtype=np.float64)
+    x /= sample_rate
+    return x.reshape(length, 1)
+
+
+def render_note(note, player):
+    """ Render the wave of note on player's time grid, at its sample rate """
+    note.sample_rate = player.sample_rate
+    return note.get_wave(player.sub_x(note.get_duration()), player.dtype)
+
+
+def load_notes(notes, player, executor=None):
+    """
+    Render the waves of notes on player's time grid. With an executor, the
+    notes the player's bank doesn't already have are rendered on its threads.
+    """
+    if executor is None or len(notes) < 2:
+        for note in notes:
+            player.load(note)
+        return
+    bank = player.bank
+    todo = [note for note in notes if bank is None or bank.fetch(note, player) is None]
+    jobs = [executor.submit(render_note, note, player) for note in todo]
+    for note, job in zip(todo, jobs):
+        job.result()
+        if bank is not None:
+            bank.keep(note, player)
 
 
 class PlayerNote:
@@ -10,31 +48,211 @@ class PlayerNote:
         self.f = f
         self.f_config = f_config
         self.wave = None
+        # the sample rate the wave is rendered at, set by whatever renders it
+        self.sample_rate = None
 
     def get_duration(self):
         return self.duration
 
-    def get_wave(self, x=None):
+    def get_wave(self, x=None, dtype=None):
+        """ Render the wave on x the first time, stored as dtype if given """
         if self.wave is None:
-            self.wave = self.f(x, self.f_config)
+            wave = self.f(x, self.f_config)
+            if dtype is not None:
+                wave = wave.astype(dtype, copy=False)
+            self.wave = wave
         return self.wave
 
+    def get_wave_key(self):
+        """
+        Return a hashable key that identifies the wave, or None if the wave
+        can't be shared with other notes.
+        """
+        return None
+
+    def get_level(self, t):
+        """ Return the note's level t seconds in, for stealing the quietest voice """
+        return 1
+
+    def get_release_time(self, t):
+        """ Return how long the note fades out for when let go of t seconds in """
+        return 0
+
+    def get_release(self, x, t):
+        """
+        Return the wave for times x of the note let go of t seconds in. x
+        continues from t, so the release picks up where the wave left off.
+        """
+        return None
+
     def __hash__(self) -> int:
         return hash(self.note_id)
 
 
 class PlayerBasicNote(PlayerNote):
-    def __init__(self, note_id, frequency, volume, fade=True):
-        super().__init__(note_id, 7, self.sin, (frequency, volume))
+    """
+    A sine shaped by an envelope (see envelope.py), which by default decays
+    exponentially if fade, else holds. The note lasts until its envelope
+    can't be heard, at most duration seconds. Envelopes that sustain are let
+    go of early enough to have faded out by then rather than be cut off.
+    """
+
+    def __init__(self, note_id, frequency, volume, fade=True, envelope=None, duration=7):
+        if envelope is None and fade:
+            envelope = ExpEnvelope(.5)
+        hold = None
+        if envelope is not None:
+            hold = envelope.get_hold_time(volume/127)
+            if hold is not None:
+                duration = min(duration, float(hold))
+        super().__init__(note_id, duration, self.sin, (frequency, volume))
         self.fade = fade
-        self.time_constant = .5
+        self.envelope = envelope
+        self.released = None
+        if envelope is not None and hold is None:
+            level = volume/127*float(envelope.levels(duration))
+            start = duration - min(float(envelope.get_release_time(level)), duration)
+            self.released = (start, volume/127*float(envelope.levels(start)))
+
+    def get_wave_key(self):
+        frequency, volume = self.f_config
+        envelope = None if self.envelope is None else self.envelope.get_key()
+        return (PlayerBasicNote, frequency, volume, envelope, self.duration)
+
+    def get_level(self, t):
+        frequency, volume = self.f_config
+        volume = volume/127
+        if self.envelope is not None:
+            volume = volume * self.envelope.levels(t)
+        if self.released is not None:
+            start, level = self.released
+            t = np.asarray(t, dtype=np.float64)
+            volume = np.where(t < start, volume, self.envelope.release_levels(t - start, level))
+        return volume
+
+    def oscillate(self, x, frequency):
+        """ The note's waveform at full level """
+        return np.sin(2*np.pi*frequency*x)
 
     def sin(self, x, config):
         frequency, volume = config
-        volume = volume/127
-        if self.fade:
-            volume = volume * np.exp(-x/self.time_constant)
-        return volume*np.sin(2*np.pi*frequency*x)
+        return self.get_level(x)*self.oscillate(x, frequency)
+
+    def get_release_time(self, t):
+        if self.envelope is None or t >= self.duration:
+            return 0
+        return float(self.envelope.get_release_time(self.get_level(t)))
+
+    def get_release(self, x, t):
+        frequency, volume = self.f_config
+        levels = self.envelope.release_levels(x - t, self.get_level(t))
+        return levels*self.oscillate(x, frequency)
+
+
+class PlayerAdditiveNote(PlayerBasicNote):
+    """
+    A note with harmonics, partials[k-1] being the amplitude of the k-th
+    (see wavetable.py for some). Partials at or above the Nyquist frequency
+    are left out so high notes don't alias. The rest are summed into a
+    cached single cycle table that is read at the note's frequency, so a
+    note costs about a sine however many partials it has. If normalize, the
+    partials are scaled so the waveform peaks at 1.
+
+    Band limiting needs the sample rate, which players and banks set when
+    they render the note. Rendering it directly needs sample_rate.
+    """
+
+    def __init__(self, note_id, frequency, volume, partials, fade=True, envelope=None,
+                 duration=7, normalize=True, sample_rate=None):
+        super().__init__(note_id, frequency, volume, fade, envelope, duration)
+        self.sample_rate = sample_rate
+        self.partials = tuple(float(p) for p in partials)
+        if normalize:
+            table, _ = harmonic_table(self.partials)
+            peak = np.abs(table).max()
+            self.partials = tuple(p/peak for p in self.partials)
+
+    def get_wave_key(self):
+        frequency, volume = self.f_config
+        envelope = None if self.envelope is None else self.envelope.get_key()
+        return (PlayerAdditiveNote, frequency, volume, self.partials, envelope,
+                self.duration)
+
+    def oscillate(self, x, frequency):
+        if self.sample_rate is None:
+            raise ValueError("PlayerAdditiveNote needs a sample rate to band limit")
+        partials = band_limit(self.partials, frequency, self.sample_rate)
+        table, slopes = harmonic_table(partials)
+        return read_table(table, slopes, frequency, x)
+
+
+class PlayerChordNote(PlayerBasicNote):
+    """
+    Several frequencies at one volume sounding as a single note.
+
+    Every frequency is rendered in one broadcast over the frequency vector
+    instead of a sin pass per note. split() turns the chord back into one
+    note per frequency sharing that render.
+    """
+
+    def __init__(self, note_id, frequencies, volume, fade=True, envelope=None, duration=7):
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        super().__init__(note_id, frequencies, volume, fade, envelope, duration)
+        self.waves = None
+
+    def get_wave_key(self):
+        frequencies, volume = self.f_config
+        envelope = None if self.envelope is None else self.envelope.get_key()
+        return (PlayerChordNote, tuple(frequencies.tolist()), volume, envelope,
+                self.duration)
+
+    def get_waves(self, x):
+        """ Return a column per frequency """
+        if self.waves is None:
+            self.waves = super().sin(x, self.f_config)
+        return self.waves
+
+    def sin(self, x, config):
+        waves = self.waves
+        if waves is None:
+            waves = super().sin(x, config)
+        return waves.sum(axis=1, keepdims=True)
+
+    def get_release(self, x, t):
+        return super().get_release(x, t).sum(axis=1, keepdims=True)
+
+    def split(self, x):
+        waves = self.get_waves(x)
+        notes = []
+        for i in range(waves.shape[1]):
+            note = PlayerNote((self.note_id, i), self.duration, None, None)
+            note.wave = waves[:, i:i+1]
+            notes.append(note)
+        return notes
+
+
+def make_note(note_id, frequency, volume, fade=True, envelope=None, partials=None):
+    """ A PlayerAdditiveNote if partials are given, else a PlayerBasicNote """
+    if partials is not None:
+        return PlayerAdditiveNote(note_id, frequency, volume, partials, fade=fade,
+                                  envelope=envelope)
+    return PlayerBasicNote(note_id, frequency, volume, fade=fade, envelope=envelope)
+
+
+def release_tail(note, player, begin, now):
+    """
+    Return the wave note fades out with when let go of at sample now, having
+    started at sample begin, or None if it stops there.
+    """
+    if now <= begin:
+        return None
+    t = (now - begin)/player.sample_rate
+    length = int(note.get_release_time(t)*player.sample_rate)
+    if length <= 0:
+        return None
+    x = time_axis(length, player.sample_rate, now - begin)
+    note.sample_rate = player.sample_rate
+    return note.get_release(x, t).astype(player.dtype, copy=False)
 
 
 class Player:
@@ -48,124 +266,341 @@ class Player:
     * f_config should have a volume component
 
     The wave f(t, f_config) + {other playing notes} for t in [0, duration]
-    is played. f should return [-1, 1] and will be multiplied by vol_max
-    to [vol_min, vol_max] dropping extras.
+    is played. t is a column of sample times, so f is only evaluated once
+    per sample no matter how many channels there are. f should return
+    [-1, 1] and will be multiplied by vol_max to [vol_min, vol_max]
+    dropping extras.
+
+    Playing voices are kept in a running Mixer, so starting or stopping a
+    note only costs that note's samples.
+
+    If a WaveBank is given, notes with the same wave key share one rendered
+    wave instead of each computing their own.
+
+    If max_voices is given, at most that many notes sound at once. Starting
+    another steals the voice of the oldest or quietest note (see VoicePool).
+
+    If stats is given, each stage of starting, stopping and rendering notes is
+    timed into it (see LatencyStats).
+
+    What is rendered goes to sink, pygame's mixer by default. Times are in
+    milliseconds on the sink's clock.
+
+    If workers is given, notes started together are rendered and mixed on
+    that many threads. NumPy lets go of the GIL while it works, so this uses
+    more cores for big chords.
+
+    Stopping a note whose envelope has a release fades it out instead of
+    cutting it off. Voices are retired when their wave, or release, runs
+    out, whether or not the note was stopped.
+
+    dtype is what waves are stored and mixed as. np.float32 halves the memory
+    every render reads and writes. Notes are still computed in float64 and
+    stored as dtype once. The mix is scaled and clipped in a buffer that is
+    kept between renders and converted into a kept int16 buffer, so sinks
+    have to copy an output they hold on to.
     """
 
-    def __init__(self, x_max=20):
-        self.sample_rate, _, self.channels = pygame.mixer.get_init()
+    def __init__(self, bank=None, max_voices=None, steal='oldest', stats=None,
+                 sink=None, workers=None, dtype=np.float64):
+        self.sink = PygameSink() if sink is None else sink
+        self.sample_rate = self.sink.sample_rate
+        self.channels = self.sink.channels
         vol_info = np.iinfo(np.int16)
         self.volume = .3
         self.vol_max = vol_info.max
         self.vol_min = vol_info.min
-        self.x_max = x_max
-        self.x = self.build_x()
-        self.sound = None
         self.notes = {}
+        self.ends = {}
+        self.endings = []
+        self.tracked = 0
+        self.dtype = np.dtype(dtype)
+        self.mixer = Mixer(self.channels, self.dtype)
+        self.scaled = np.zeros((0, self.channels), dtype=self.dtype)
+        self.output = np.zeros((0, self.channels), dtype=np.int16)
+        self.bank = bank
+        self.pool = None
+        if max_voices is not None:
+            self.pool = VoicePool(max_voices, steal)
+        self.stats = stats
+        self.workers = workers
+        self.executor = None
+        if workers is not None and workers > 1:
+            self.executor = ThreadPoolExecutor(workers)
 
-    def build_x(self):
-        length = int(self.x_max*self.sample_rate)
-        x = np.linspace(0, self.x_max, length, endpoint=True)
-        x = x.repeat(self.channels).reshape(length, self.channels)
-        x = np.ascontiguousarray(x)
-        return x
+    def sub_x(self, time, offset=0):
+        """
+        Return the times of time seconds worth of samples starting offset
+        samples in. The result is a single column that broadcasts over every
+        channel when mixed.
+        """
+        return time_axis(int(time*self.sample_rate), self.sample_rate, offset)
 
-    def sub_x(self, time):
-        length = int(time*self.sample_rate)
-        return self.x[:length, :]
+    def load(self, note):
+        if self.bank is None:
+            render_note(note, self)
+        else:
+            self.bank.load(note, self)
+
+    def to_sample(self, time):
+        return int(time/1000*self.sample_rate)
+
+    @staticmethod
+    def reuse(buffer, length):
+        """ Return the first length rows of buffer, growing it if needed """
+        if buffer.shape[0] < length:
+            buffer = np.empty((length*3//2, buffer.shape[1]), dtype=buffer.dtype)
+        return buffer
 
     def build_wave(self, time):
-        total_wave = None
-        for note, note_time in self.notes.items():
-            if note_time is None:
-                continue
-            wave = note.get_wave()
-            delta_t = (time - note_time)/1000  # seconds after
-            current_pos = int(delta_t * self.sample_rate)
-            if current_pos >= wave.shape[0]:
-                continue
-            length = wave[current_pos:, :].shape[0]
-            if total_wave is None:
-                total_wave = np.zeros(wave.shape)
-            total_wave[:length, :] += wave[current_pos:, :]
-        if total_wave is not None:
-            total_wave *= self.vol_max*self.volume
-            total_wave[total_wave > self.vol_max] = self.vol_max
-            total_wave[total_wave < self.vol_min] = self.vol_min
+        """ Return the scaled and clipped mix, a view of a reused buffer """
+        wave = self.mixer.read(self.to_sample(time))
+        length = wave.shape[0]
+        if length == 0:
+            return None
+        self.scaled = self.reuse(self.scaled, length)
+        total_wave = self.scaled[:length]
+        np.multiply(wave, self.vol_max*self.volume, out=total_wave)
+        np.clip(total_wave, self.vol_min, self.vol_max, out=total_wave)
         return total_wave
 
     def build_sound(self, time):
         wave = self.build_wave(time)
-        if wave is None:
-            return
-        else:
-            wave = wave.astype(np.int16)
-        self.sound = pygame.sndarray.make_sound(wave)
+        if self.stats is not None:
+            self.stats.lap('mix')
+        if wave is not None:
+            self.output = self.reuse(self.output, wave.shape[0])
+            sound = self.output[:wave.shape[0]]
+            np.copyto(sound, wave, casting='unsafe')
+            wave = sound
+        if self.stats is not None:
+            self.stats.lap('convert')
+        return wave
 
     def play(self, note, time=None):
         if time is None:
-            time = pygame.time.get_ticks()
-        note.get_wave(self.sub_x(note.get_duration()))
-        self.notes[note] = time
+            time = self.sink.get_ticks()
+        self.start(note, time, time)
         self.render(time)
 
     def play_all(self, notes, times=None):
+        curr_time = self.sink.get_ticks()
         if times is None:
-            curr_time = pygame.time.get_ticks()
             times = [curr_time for _ in notes]
+        if self.executor is not None and len(notes) > 1:
+            self.start_all(notes, times, curr_time)
+        else:
+            for note, time in zip(notes, times):
+                self.start(note, time, curr_time)
+        if len(notes) > 0:
+            self.render(curr_time)
+
+    def acquire(self, note, time, now):
+        if self.pool is not None:
+            stolen = self.pool.acquire(note, time, now)
+            if stolen is not None:
+                self.end(stolen, now)
+
+    def start(self, note, time, now):
+        self.acquire(note, time, now)
+        self.load(note)
+        if self.stats is not None:
+            self.stats.lap('synth')
+        self.notes[note] = time
+        self.mixer.add(note, note.get_wave(), self.to_sample(time),
+                       self.to_sample(now))
+        self.track(note, self.to_sample(time) + note.get_wave().shape[0])
+        if self.stats is not None:
+            self.stats.lap('mix')
+
+    def start_all(self, notes, times, now):
+        for note, time in zip(notes, times):
+            self.acquire(note, time, now)
+        if self.pool is not None:
+            # notes can steal voices from notes started with them
+            started = [(n, t) for n, t in zip(notes, times) if n in self.pool]
+            notes = [n for n, _ in started]
+            times = [t for _, t in started]
+        load_notes(notes, self, self.executor)
+        if self.stats is not None:
+            self.stats.lap('synth')
+        voices = []
         for note, time in zip(notes, times):
-            note.get_wave(self.sub_x(note.get_duration()))
             self.notes[note] = time
-        if len(notes) > 0:
-            self.render(pygame.time.get_ticks())
+            voices.append((note, note.get_wave(), self.to_sample(time)))
+            self.track(note, self.to_sample(time) + note.get_wave().shape[0])
+        self.mixer.add_all(voices, self.to_sample(now), self.executor, self.workers)
+        if self.stats is not None:
+            self.stats.lap('mix')
 
     def stop(self, note):
-        self.notes[note] = None
-        self.render(pygame.time.get_ticks())
+        curr_time = self.sink.get_ticks()
+        self.release(note, curr_time)
+        self.render(curr_time)
 
     def stop_all(self, notes):
+        curr_time = self.sink.get_ticks()
         for note in notes:
-            self.notes[note] = None
+            self.release(note, curr_time)
         if len(notes) > 0:
-            self.render(pygame.time.get_ticks())
+            self.render(curr_time)
+
+    def track(self, note, end):
+        """ Retire note's voice once the playhead reaches sample end """
+        self.ends[note] = end
+        self.tracked += 1
+        heapq.heappush(self.endings, (end, self.tracked, note))
+
+    def retire(self, now):
+        """ End every voice that has run out by now """
+        sample = self.to_sample(now)
+        while len(self.endings) > 0 and self.endings[0][0] <= sample:
+            end, _, note = heapq.heappop(self.endings)
+            if self.ends.get(note) == end:
+                self.end(note, now)
+
+    def release(self, note, now):
+        """ Let go of note, fading it out if it has a release """
+        if self.notes.pop(note, None) is None:
+            return
+        sample = self.to_sample(now)
+        tail = None
+        if note in self.mixer:
+            begin, _ = self.mixer.voices[note]
+            tail = release_tail(note, self, begin, sample)
+        if tail is None:
+            self.end(note, now)
+            return
+        if self.stats is not None:
+            self.stats.lap('synth')
+        self.mixer.add(note, tail, sample, sample)
+        self.track(note, sample + tail.shape[0])
+        if self.stats is not None:
+            self.stats.lap('mix')
+
+    def end(self, note, now):
+        self.notes.pop(note, None)
+        self.ends.pop(note, None)
+        self.mixer.remove(note, self.to_sample(now))
+        if self.pool is not None:
+            self.pool.release(note)
+        if self.stats is not None:
+            self.stats.lap('mix')
 
     def render(self, time):
-        old_sound = self.sound
-        self.build_sound(time)
-        if self.sound is not None:
-            self.sound.play()
-        if old_sound is not None:
-            old_sound.stop()
+        self.retire(time)
+        self.sink.output(self.build_sound(time))
+        if self.stats is not None:
+            self.stats.lap('play')
 
-    @staticmethod
-    def delay(ms):
-        pygame.time.delay(ms)
+    def get_ticks(self):
+        return self.sink.get_ticks()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def delay(self, ms):
+        self.sink.delay(ms)
 
 
 class KeyboardPlayer:
-    def __init__(self, keyboard, player, generator):
+    """
+    Plays what is held down on a keyboard.
+
+    Keyboards notify with the changes since the last update, so an update
+    only costs the keys that changed. Without changes, the whole keyboard is
+    compared against what is playing.
+
+    Notes are shaped by envelope if given, else they fade like
+    PlayerBasicNote's do by default. They are sines unless partials are
+    given (see PlayerAdditiveNote), or samples if a Sampler is given.
+    """
+
+    def __init__(self, keyboard, player, generator, stats=None, envelope=None,
+                 partials=None, sampler=None):
         self.keyboard = keyboard
         self.player = player
         self.generator = generator
+        self.envelope = envelope
+        self.partials = partials
+        self.sampler = sampler
         self.playing = {}
+        self.strikes = {}
+        self.stats = stats
+
+    def make_note_id(self, key, volume, time):
+        """ Return None for keys the tuning leaves unmapped """
+        freq = self.generator.get_freq(key)
+        if isnan(freq):
+            return None
+        # sampled waves don't depend on velocity, which picks their layer
+        if self.player.bank is not None and self.sampler is None:
+            volume = self.player.bank.quantize(volume)
+        return freq, volume, time
 
-    def update(self, keyboard):
+    def make_note(self, note_id):
+        freq, volume, _ = note_id
+        if self.sampler is not None:
+            return self.sampler.make_note(note_id, freq, volume, self.envelope)
+        return make_note(note_id, freq, volume, envelope=self.envelope, partials=self.partials)
+
+    def update(self, keyboard, changes=None):
+        if changes is None:
+            self.sync(keyboard)
+            return
+        to_stop = []
+        for key in changes.released:
+            for note_id in self.strikes.pop(key, []):
+                if note_id in self.playing:
+                    to_stop.append(self.playing.pop(note_id))
+        for key, volume, time in changes.dropped:
+            note_id = self.make_note_id(key, volume, time)
+            if note_id in self.playing:
+                to_stop.append(self.playing.pop(note_id))
+                self.strikes[key].remove(note_id)
+        if self.stats is not None:
+            self.stats.lap('update')
+        self.player.stop_all(to_stop)
+
+        notes = []
+        times = []
+        for key, volume, time in changes.pressed:
+            note_id = self.make_note_id(key, volume, time)
+            if note_id is None or note_id in self.playing:
+                continue
+            note = self.make_note(note_id)
+            self.playing[note_id] = note
+            self.strikes.setdefault(key, []).append(note_id)
+            notes.append(note)
+            times.append(time)
+        if self.stats is not None:
+            self.stats.lap('update')
+        self.player.play_all(notes, times)
+
+    def sync(self, keyboard):
         keep = set()
+        strikes = {}
         to_play = set()
         for key, values in keyboard.keys.items():
             if values is None:
                 continue
             for value in values:
-                freq = self.generator.get_freq(key)
                 volume, time = value
-                note_id = (freq, volume, time)
+                note_id = self.make_note_id(key, volume, time)
+                if note_id is None:
+                    continue
                 keep.add(note_id)
+                strikes.setdefault(key, []).append(note_id)
                 if note_id not in self.playing:
-                    note = PlayerBasicNote(note_id, freq, volume)
+                    note = self.make_note(note_id)
                     self.playing[note_id] = note
                     to_play.add((note, time))
+        self.strikes = strikes
         notes = [note for note, time in to_play]
         times = [time for note, time in to_play]
+        if self.stats is not None:
+            self.stats.lap('update')
         self.player.play_all(notes, times)
 
         to_stop = []
@@ -174,6 +609,8 @@ class KeyboardPlayer:
                 note = self.playing[note_id]
                 to_stop.append(note)
                 del self.playing[note_id]
+        if self.stats is not None:
+            self.stats.lap('update')
         self.player.stop_all(to_stop)
 
     def run(self):
@@ -185,4 +622,10 @@ class KeyboardPlayer:
         except KeyboardInterrupt:
             print("Exiting.")
 
-
+    async def run_async(self):
+        """ run() for an AsyncKeyboardMidi, sharing the running event loop """
+        self.keyboard.watch(self)
+        try:
+            await self.keyboard.listen()
+        except IOError as err:
+            print(err)
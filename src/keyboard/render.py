@@ -0,0 +1,158 @@
+import wave as wav
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from .mixer import Mixer
+from .player import load_notes, release_tail, render_note, time_axis
+from .voices import VoicePool
+
+
+class OfflineRenderer:
+    """
+    Renders notes to samples without pygame's mixer, as fast as it can.
+
+    Notes are started and stopped at times in milliseconds the same way they
+    are with a Player, but nothing is played. render() runs the events
+    through the same Mixer the Player uses, so the output is what a Player
+    would have played, placed on exact sample positions.
+
+    After each render, speed is how many seconds of audio were produced per
+    second of wall time. With workers, every note's wave is rendered up front
+    on that many threads. Stopped notes fade out over their release like
+    they do on a Player.
+    """
+
+    def __init__(self, sample_rate=44100, channels=2, bank=None,
+                 max_voices=None, steal='oldest', workers=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = np.dtype(np.float64)
+        self.volume = .3
+        self.bank = bank
+        self.max_voices = max_voices
+        self.steal = steal
+        self.workers = workers
+        self.events = []
+        self.speed = None
+
+    def sub_x(self, time, offset=0):
+        return time_axis(int(time*self.sample_rate), self.sample_rate, offset)
+
+    def load(self, note):
+        if self.bank is None:
+            render_note(note, self)
+        else:
+            self.bank.load(note, self)
+
+    def to_sample(self, time):
+        return int(time/1000*self.sample_rate)
+
+    def play(self, note, time):
+        self.events.append((time, True, note))
+
+    def play_all(self, notes, times):
+        for note, time in zip(notes, times):
+            self.play(note, time)
+
+    def stop(self, note, time):
+        self.events.append((time, False, note))
+
+    def stop_all(self, notes, time):
+        for note in notes:
+            self.stop(note, time)
+
+    def clear(self):
+        self.events = []
+
+    def render(self, dtype=np.int16, length=None):
+        """
+        Return every event mixed into one (samples, channels) array.
+
+        int16 output is scaled like a Player's. Float output is in [-1, 1].
+        The render runs until the last note ends, or for length ms if given.
+        """
+        started = perf_counter()
+        if self.workers is not None and self.workers > 1:
+            notes = list({note: None for _, start, note in self.events if start})
+            with ThreadPoolExecutor(self.workers) as executor:
+                load_notes(notes, self, executor)
+        mixer = Mixer(self.channels)
+        pool = None
+        if self.max_voices is not None:
+            pool = VoicePool(self.max_voices, self.steal)
+        chunks = []
+        released = set()
+        playhead = 0
+        for time, start, note in sorted(self.events, key=lambda e: e[0]):
+            sample = self.to_sample(time)
+            if sample > playhead:
+                chunks.append(self.take(mixer, playhead, sample))
+                playhead = sample
+            if start:
+                released.discard(note)
+                if pool is not None:
+                    stolen = pool.acquire(note, time)
+                    if stolen is not None:
+                        mixer.remove(stolen, sample)
+                if note.wave is None:
+                    self.load(note)
+                mixer.add(note, note.get_wave(), sample, sample)
+            elif note not in released:
+                released.add(note)
+                tail = None
+                if note in mixer:
+                    begin, _ = mixer.voices[note]
+                    tail = release_tail(note, self, begin, sample)
+                if tail is None:
+                    mixer.remove(note, sample)
+                else:
+                    mixer.add(note, tail, sample, sample)
+                if pool is not None:
+                    pool.release(note)
+        if length is None:
+            end = max(mixer.end, playhead)
+        else:
+            end = self.to_sample(length)
+        chunks.append(self.take(mixer, playhead, end))
+        wave = np.concatenate(chunks)[:end]
+        wave = self.convert(wave, dtype)
+        elapsed = perf_counter() - started
+        self.speed = (wave.shape[0]/self.sample_rate)/max(elapsed, 1e-9)
+        return wave
+
+    def take(self, mixer, start, end):
+        chunk = np.zeros((max(end - start, 0), self.channels))
+        wave = mixer.read(start)[:chunk.shape[0], :]
+        chunk[:wave.shape[0], :] = wave
+        return chunk
+
+    def convert(self, wave, dtype):
+        dtype = np.dtype(dtype)
+        # wave is a fresh concatenation, so it can be scaled in place
+        if dtype.kind == 'f':
+            wave *= self.volume
+            np.clip(wave, -1, 1, out=wave)
+            return wave.astype(dtype)
+        vol_info = np.iinfo(dtype)
+        wave *= vol_info.max*self.volume
+        np.clip(wave, vol_info.min, vol_info.max, out=wave)
+        return wave.astype(dtype)
+
+    def write(self, path, length=None):
+        """
+        Render to path. A .npy path gets float32 samples, anything else a
+        16 bit WAV file.
+        """
+        if str(path).endswith('.npy'):
+            wave = self.render(np.float32, length)
+            np.save(path, wave)
+            return wave
+        wave = self.render(np.int16, length)
+        with wav.open(str(path), 'wb') as out:
+            out.setnchannels(self.channels)
+            out.setsampwidth(2)
+            out.setframerate(self.sample_rate)
+            out.writeframes(wave.astype('<i2').tobytes())
+        return wave
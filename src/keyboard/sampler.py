@@ -0,0 +1,286 @@
+"""
+Notes played from recorded WAV files, one sample per key range and velocity
+layer.
+
+Samples are memory mapped straight from the WAV's data chunk, so loading a
+sample set costs nothing until keys are played and the OS pages samples in
+and out as it needs to. Keys without a sample of their own play the nearest
+sample of their layer resampled to their frequency.
+"""
+import os
+import struct
+from functools import lru_cache
+
+import numpy as np
+
+from .envelope import Envelope
+from .music import Note
+from .player import PlayerNote
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xfffe
+
+WAV_DTYPES = {
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8'),
+}
+
+
+def read_wav_header(path):
+    """
+    Return (sample_rate, channels, dtype, offset, frames) of a WAV file,
+    offset being where its samples start, by walking its RIFF chunks.
+    """
+    with open(path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError("Not a wav file: {}".format(path))
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("No data chunk in {}".format(path))
+            kind, length = struct.unpack('<4sI', header)
+            if kind == b'fmt ':
+                fmt = f.read(length)
+                f.seek(length % 2, os.SEEK_CUR)
+            elif kind == b'data':
+                offset = f.tell()
+                break
+            else:
+                # chunks are padded to an even length
+                f.seek(length + length % 2, os.SEEK_CUR)
+    if fmt is None:
+        raise ValueError("No fmt chunk in {}".format(path))
+    tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag, = struct.unpack('<H', fmt[24:26])
+    dtype = WAV_DTYPES.get((tag, bits))
+    if dtype is None:
+        raise ValueError("Unsupported wav format {} with {} bits in {}".format(tag, bits, path))
+    frames = min(length, os.path.getsize(path) - offset)//block_align
+    return sample_rate, channels, dtype, offset, frames
+
+
+def map_wav(path):
+    """
+    Return the samples of a WAV file as a read only (frames, channels)
+    memmap and its sample rate.
+    """
+    sample_rate, channels, dtype, offset, frames = read_wav_header(path)
+    data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(frames, channels))
+    return data, sample_rate
+
+
+@lru_cache(maxsize=256)
+def resample_table(step, length):
+    """
+    Return (index, fraction) columns for reading length samples every step
+    samples of a source by linear interpolation. Tables depend only on the
+    step, so every sample shifted by the same interval shares them.
+    """
+    position = np.arange(length, dtype=np.float64)*step
+    index = position.astype(np.intp)
+    fraction = (position - index).reshape(length, 1)
+    index.flags.writeable = False
+    fraction.flags.writeable = False
+    return index, fraction
+
+
+class Sample:
+    """
+    A WAV file recorded at key root, playing keys low to high struck with
+    velocities low_velocity to high_velocity. low and high default to root.
+    The file is mapped by map().
+    """
+
+    def __init__(self, path, root, low=None, high=None, low_velocity=0, high_velocity=127):
+        self.path = path
+        self.root = root
+        self.low = root if low is None else low
+        self.high = root if high is None else high
+        self.low_velocity = low_velocity
+        self.high_velocity = high_velocity
+        self.data = None
+        self.sample_rate = None
+        self.identity = None
+
+    def map(self):
+        if self.data is None:
+            self.data, self.sample_rate = map_wav(self.path)
+            # the file may be rewritten under the same name, so waves made from
+            # it are told apart by its size and modification time too
+            stat = os.stat(self.path)
+            self.identity = (os.path.abspath(self.path), stat.st_mtime_ns, stat.st_size)
+        return self.data
+
+    def fits(self, dtype, channels):
+        """ Whether the mapped samples can be played as they are """
+        data = self.map()
+        return data.dtype == np.dtype(dtype) and data.shape[1] in (1, channels)
+
+    def convert(self, rows, channels):
+        """
+        Return rows of the samples as float64 in [-1, 1] with 1 or channels
+        columns. Only the rows given are converted, the file is never copied
+        whole.
+        """
+        wave = np.asarray(rows, dtype=np.float64)
+        if rows.dtype.kind == 'i':
+            wave = wave/2**(8*rows.dtype.itemsize - 1)
+        if wave.shape[1] not in (1, channels):
+            wave = wave.mean(axis=1, keepdims=True)
+        return wave
+
+
+class PlayerSampledNote(PlayerNote):
+    """
+    A sample played step source samples per output sample, 1 playing it as
+    recorded. At step 1, when the sample is already in the mix dtype, the wave
+    is a view of the sample's data, so when the data is mapped, playing it
+    copies nothing. Otherwise only the rows played are read from the data,
+    through a cached resample_table when shifted.
+
+    Velocity only picks the sample, which plays at its recorded level so that
+    notes can share it. Held notes play the whole sample, let go of notes
+    fade out over the envelope's release.
+    """
+
+    def __init__(self, note_id, sample, step, sample_rate, channels, envelope=None,
+                 dtype=np.float64):
+        sample.map()
+        length = int((sample.data.shape[0] - 1)/step) + 1
+        super().__init__(note_id, length/sample_rate, self.read, None)
+        self.sample = sample
+        self.step = step
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.envelope = Envelope(.05) if envelope is None else envelope
+        self.dtype = np.dtype(dtype)
+
+    def get_wave_key(self):
+        if self.step == 1 and self.sample.fits(self.dtype, self.channels):
+            # a view of the sample, there is nothing to share
+            return None
+        return (PlayerSampledNote,) + self.sample.identity + (self.step, self.channels)
+
+    def read(self, x, config):
+        length = x.shape[0]
+        data = self.sample.data
+        if self.step == 1:
+            return self.sample.convert(data[:length], self.channels)
+        index, fraction = resample_table(self.step, length)
+        upper = np.minimum(index + 1, data.shape[0] - 1)
+        lower = self.sample.convert(np.take(data, index, axis=0), self.channels)
+        wave = self.sample.convert(np.take(data, upper, axis=0), self.channels)
+        wave -= lower
+        wave *= fraction
+        wave += lower
+        return wave
+
+    def get_wave(self, x=None, dtype=None):
+        if self.wave is None and self.step == 1:
+            dtype = self.dtype if dtype is None else dtype
+            if self.sample.fits(dtype, self.channels):
+                self.wave = self.sample.data[:x.shape[0]]
+        return super().get_wave(x, dtype)
+
+    def get_release_time(self, t):
+        return min(float(self.envelope.get_release_time(1)), max(self.duration - t, 0))
+
+    def get_release(self, x, t):
+        begin = int(round(x[0, 0]*self.sample_rate))
+        wave = self.get_wave()[begin:begin + x.shape[0]]
+        levels = self.envelope.release_levels(x[:wave.shape[0]] - t, 1)
+        return levels*wave
+
+
+class Sampler:
+    """
+    Makes PlayerSampledNotes from samples for the frequencies of keyset.
+
+    A note plays the sample of its velocity layer whose key range covers its
+    frequency, the one with the closest root if several do, else the closest
+    sample of the layer. It is shifted from the root's frequency to its own
+    and from the sample's rate to sample_rate. Notes are made for a player
+    mixing in dtype.
+    """
+
+    def __init__(self, samples, keyset, sample_rate=44100, channels=2, envelope=None,
+                 dtype=np.float64):
+        self.samples = list(samples)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.envelope = envelope
+        self.dtype = dtype
+        for sample in self.samples:
+            sample.map()
+        self.roots = np.log2([keyset.get_freq(s.root) for s in self.samples])
+        self.lows = np.log2([keyset.get_freq(s.low) for s in self.samples])
+        self.highs = np.log2([keyset.get_freq(s.high) for s in self.samples])
+        self.low_velocities = np.array([s.low_velocity for s in self.samples])
+        self.high_velocities = np.array([s.high_velocity for s in self.samples])
+
+    def find(self, frequency, volume):
+        """ Return the index of the sample that plays frequency at volume """
+        pitch = np.log2(frequency)
+        cost = np.abs(self.roots - pitch)
+        cost[np.isnan(cost)] = np.inf
+        cost[(pitch < self.lows - 1e-9) | (pitch > self.highs + 1e-9)] += 1000
+        layer = (volume >= self.low_velocities) & (volume <= self.high_velocities)
+        if layer.any():
+            cost[~layer] = np.inf
+        return int(np.argmin(cost))
+
+    def get_step(self, index, frequency):
+        sample = self.samples[index]
+        step = 2**(np.log2(frequency) - self.roots[index])*sample.sample_rate/self.sample_rate
+        # notes within rounding of the root play it as is
+        return 1 if abs(step - 1) < 1e-9 else float(step)
+
+    def make_note(self, note_id, frequency, volume, envelope=None):
+        index = self.find(frequency, volume)
+        step = self.get_step(index, frequency)
+        return PlayerSampledNote(note_id, self.samples[index], step, self.sample_rate,
+                                 self.channels, self.envelope if envelope is None else envelope,
+                                 self.dtype)
+
+    @classmethod
+    def from_file(cls, path, keyset, sample_rate=44100, channels=2, envelope=None,
+                  dtype=np.float64):
+        """ Make a Sampler from a file read with read_sample_map """
+        return cls(read_sample_map(path), keyset, sample_rate, channels, envelope, dtype)
+
+
+def parse_key(value):
+    """ A key number or a note name like C#4 """
+    return int(value) if value.lstrip('-').isdigit() else Note(value).get_key()
+
+
+def read_sample_map(path):
+    """
+    Read a list of Samples. Each line is a sample:
+
+        file root [low high [low_velocity high_velocity]]
+
+    with keys given as numbers or names like C#4, and file relative to the
+    list. Everything after a # is a comment.
+    """
+    samples = []
+    folder = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if len(fields) == 0:
+                continue
+            if len(fields) not in (2, 4, 6):
+                raise ValueError("{}:{}: expected file root [low high [low_velocity high_velocity]]"
+                                 .format(path, number))
+            keys = [parse_key(value) for value in fields[1:4]] + [None, None]
+            velocities = [int(value) for value in fields[4:6]] or [0, 127]
+            samples.append(Sample(os.path.join(folder, fields[0]), keys[0], keys[1], keys[2],
+                                  velocities[0], velocities[1]))
+    return samples
@@ -0,0 +1,285 @@
+"""
+Scores, read from Standard MIDI Files or a plain text format, and a
+Sequencer that plays them on a Player or renders them offline.
+
+A score is a SCORE_DTYPE array of notes sorted by time. Times and durations
+are in milliseconds and keys are KeySet keys, A0 being 0.
+"""
+import struct
+
+import numpy as np
+
+from .music import Note
+from .player import make_note
+
+SCORE_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('duration', '<f8'),
+    ('key', '<i2'),
+    ('velocity', 'u1'),
+])
+
+MIDI_A0 = 21
+DEFAULT_TEMPO = 500000  # microseconds per quarter note, 120 bpm
+
+
+def make_score(notes):
+    """ Turn (time, duration, key, velocity) tuples into a sorted score """
+    score = np.array([tuple(note) for note in notes], dtype=SCORE_DTYPE)
+    return score[np.argsort(score['time'], kind='stable')]
+
+
+def read_score(path):
+    """
+    Read a text score. Each line is a note:
+
+        time duration note [velocity]
+
+    with time and duration in milliseconds and note either a name like C#4
+    or a key number. velocity is 100 if left out. Everything after a # is a
+    comment.
+    """
+    notes = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if len(fields) == 0:
+                continue
+            if len(fields) not in (3, 4):
+                raise ValueError("{}:{}: expected time duration note [velocity]".format(path, number))
+            time, duration = float(fields[0]), float(fields[1])
+            key = int(fields[2]) if fields[2].lstrip('-').isdigit() else Note(fields[2]).get_key()
+            velocity = int(fields[3]) if len(fields) == 4 else 100
+            notes.append((time, duration, key, velocity))
+    return make_score(notes)
+
+
+def read_varlen(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, pos
+
+
+def read_track(data):
+    """
+    Return the (tick, status, data1, data2) channel messages, (tick, tempo)
+    changes and last tick of one MTrk chunk.
+    """
+    messages = []
+    tempos = []
+    tick = 0
+    pos = 0
+    status = None
+    while pos < len(data):
+        delta, pos = read_varlen(data, pos)
+        tick += delta
+        byte = data[pos]
+        if byte == 0xff:
+            kind = data[pos+1]
+            length, pos = read_varlen(data, pos+2)
+            if kind == 0x51 and length == 3:
+                tempos.append((tick, int.from_bytes(data[pos:pos+3], 'big')))
+            pos += length
+            if kind == 0x2f:
+                break
+            continue
+        if byte in (0xf0, 0xf7):
+            length, pos = read_varlen(data, pos+1)
+            pos += length
+            continue
+        if byte & 0x80:
+            status = byte
+            pos += 1
+        elif status is None:
+            raise ValueError("Midi data without a status byte")
+        if (status & 0xf0) in (0xc0, 0xd0):
+            messages.append((tick, status, data[pos], 0))
+            pos += 1
+        else:
+            messages.append((tick, status, data[pos], data[pos+1]))
+            pos += 2
+    return messages, tempos, tick
+
+
+def ticks_to_ms(ticks, division, tempos):
+    """ Convert ticks to milliseconds through a sorted [(tick, tempo)] map """
+    ticks = np.asarray(ticks, dtype=np.float64)
+    if division & 0x8000:
+        frames = 256 - (division >> 8)
+        return ticks*1000/(frames*(division & 0xff))
+    change_ticks = np.array([0] + [t for t, _ in tempos], dtype=np.float64)
+    change_tempos = np.array([DEFAULT_TEMPO] + [tempo for _, tempo in tempos], dtype=np.float64)
+    ms_per_tick = change_tempos/1000/division
+    change_ms = np.concatenate([[0], np.cumsum(np.diff(change_ticks)*ms_per_tick[:-1])])
+    index = np.searchsorted(change_ticks, ticks, side='right') - 1
+    return change_ms[index] + (ticks - change_ticks[index])*ms_per_tick[index]
+
+
+def read_midi_file(path):
+    """
+    Read the notes of a Standard MIDI File into a score. Every track and
+    channel is played, and notes still held at the end of a track last until
+    then.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != b'MThd':
+        raise ValueError("Not a midi file: {}".format(path))
+    length, = struct.unpack('>I', data[4:8])
+    _, _, division = struct.unpack('>HHH', data[8:14])
+    pos = 8 + length
+    tracks = []
+    tempos = []
+    while pos + 8 <= len(data):
+        kind = data[pos:pos+4]
+        length, = struct.unpack('>I', data[pos+4:pos+8])
+        chunk = data[pos+8:pos+8+length]
+        pos += 8 + length
+        if kind == b'MTrk':
+            messages, track_tempos, end = read_track(chunk)
+            tracks.append((messages, end))
+            tempos.extend(track_tempos)
+    tempos.sort(key=lambda change: change[0])
+
+    notes = []
+    for messages, end in tracks:
+        held = {}
+        for tick, status, key, velocity in messages:
+            kind = status & 0xf0
+            if kind not in (0x80, 0x90):
+                continue
+            strikes = held.setdefault((status & 0x0f, key), [])
+            if kind == 0x90 and velocity > 0:
+                strikes.append((tick, velocity))
+            elif len(strikes) > 0:
+                start, start_velocity = strikes.pop(0)
+                notes.append((start, tick, key, start_velocity))
+        for (_, key), strikes in held.items():
+            for start, velocity in strikes:
+                notes.append((start, end, key, velocity))
+    if len(notes) == 0:
+        return make_score([])
+    starts, ends, keys, velocities = (np.array(column) for column in zip(*notes))
+    starts = ticks_to_ms(starts, division, tempos)
+    ends = ticks_to_ms(ends, division, tempos)
+    return make_score(zip(starts, ends - starts, keys - MIDI_A0, velocities))
+
+
+def load_score(path):
+    """ Read a midi file if path ends with .mid or .midi, else a text score """
+    if str(path).lower().endswith(('.mid', '.midi')):
+        return read_midi_file(path)
+    return read_score(path)
+
+
+class Sequencer:
+    """
+    Plays a score on a Player, or anything with its start/release/render
+    methods, with the frequencies of keyset.
+
+    Notes are handed to the player lookahead milliseconds before they are
+    due with the time they are due, so the mixer places each onset and
+    release at its own sample instead of at the next render. Score times are
+    counted from a start time on the player's clock rather than by adding
+    up delays, so nothing drifts however long the score.
+
+    Keys outside keyset or that it leaves unmapped are skipped. Notes are
+    played by sampler if given.
+    """
+
+    def __init__(self, player, keyset, lookahead=100, envelope=None, partials=None,
+                 sampler=None):
+        self.player = player
+        self.keyset = keyset
+        self.lookahead = lookahead
+        self.envelope = envelope
+        self.partials = partials
+        self.sampler = sampler
+        self.schedule(make_score([]), 0)
+
+    def get_freqs(self, keys):
+        freqs = np.full(len(keys), np.nan)
+        valid = (keys >= 0) & (keys < len(self.keyset.keys))
+        freqs[valid] = self.keyset.get_freqs(keys[valid])
+        return freqs
+
+    def make_note(self, index, bank=None):
+        freq = self.freqs[index]
+        if np.isnan(freq):
+            return None
+        volume = int(self.score['velocity'][index])
+        # sampled waves don't depend on velocity, which picks their layer
+        if bank is not None and self.sampler is None:
+            volume = bank.quantize(volume)
+        if self.sampler is not None:
+            return self.sampler.make_note(('score', index), float(freq), volume, self.envelope)
+        return make_note(('score', index), float(freq), volume, envelope=self.envelope,
+                         partials=self.partials)
+
+    def schedule(self, score, start):
+        """ Play score with its time 0 at start on the player's clock """
+        self.score = score
+        self.start = start
+        self.freqs = self.get_freqs(score['key'])
+        self.notes = [None]*len(score)
+        ends = score['time'] + score['duration']
+        self.release_order = np.argsort(ends, kind='stable')
+        self.ends = ends[self.release_order]
+        self.started = 0
+        self.released = 0
+
+    def done(self):
+        return self.released >= len(self.score)
+
+    def tick(self, now):
+        """
+        Start and release every note due before now + lookahead. Returns
+        whether there was anything to do.
+        """
+        horizon = now + self.lookahead - self.start
+        last_start = int(np.searchsorted(self.score['time'], horizon, side='right'))
+        last_release = int(np.searchsorted(self.ends, horizon, side='right'))
+        if last_start == self.started and last_release == self.released:
+            return False
+        for index in range(self.started, last_start):
+            note = self.make_note(index, self.player.bank)
+            if note is not None:
+                self.notes[index] = note
+                self.player.start(note, self.start + self.score['time'][index], now)
+        self.started = last_start
+        for index in self.release_order[self.released:last_release]:
+            note = self.notes[index]
+            if note is not None:
+                self.notes[index] = None
+                self.player.release(note, self.start + self.ends[self.released])
+            self.released += 1
+        self.player.render(now)
+        return True
+
+    def play(self, score):
+        """ Play score from lookahead ms from now until its last note fades """
+        player = self.player
+        self.schedule(score, player.get_ticks() + self.lookahead)
+        interval = max(int(self.lookahead//4), 1)
+        while not self.done():
+            self.tick(player.get_ticks())
+            player.delay(interval)
+        left = player.mixer.end*1000/player.sample_rate - player.get_ticks()
+        if left > 0:
+            player.delay(int(left) + 1)
+
+    def render(self, score, renderer):
+        """ Put every note of score on an OfflineRenderer """
+        self.schedule(score, 0)
+        for index in range(len(score)):
+            note = self.make_note(index, renderer.bank)
+            if note is None:
+                continue
+            time = score['time'][index]
+            renderer.play(note, time)
+            renderer.stop(note, time + score['duration'][index])
+        return renderer
@@ -0,0 +1,79 @@
+from collections import deque
+from time import perf_counter, sleep
+
+from .backend import init_mixer
+
+
+class PygameSink:
+    """
+    Plays a Player's output through pygame's mixer.
+
+    Each output replaces the sound playing before it. The clock is pygame's
+    ticks in milliseconds.
+    """
+
+    def __init__(self):
+        self.pygame = init_mixer()
+        self.sample_rate, _, self.channels = self.pygame.mixer.get_init()
+        self.sound = None
+
+    def get_ticks(self):
+        return self.pygame.time.get_ticks()
+
+    def delay(self, ms):
+        self.pygame.time.delay(ms)
+
+    def output(self, wave):
+        """ Play an int16 (samples, channels) wave, or stop if wave is None """
+        old_sound = self.sound
+        if wave is None:
+            self.sound = None
+        else:
+            self.sound = self.pygame.sndarray.make_sound(wave)
+            self.sound.play()
+        if old_sound is not None:
+            old_sound.stop()
+
+
+class NullSink:
+    """
+    Throws a Player's output away, for running without audio.
+
+    The clock is wall time in milliseconds since the sink was made.
+    outputs and samples count what would have been played.
+    """
+
+    def __init__(self, sample_rate=44100, channels=2):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.started = perf_counter()
+        self.outputs = 0
+        self.samples = 0
+
+    def get_ticks(self):
+        return int((perf_counter() - self.started)*1000)
+
+    def delay(self, ms):
+        sleep(ms/1000)
+
+    def output(self, wave):
+        self.outputs += 1
+        if wave is not None:
+            self.samples += wave.shape[0]
+
+
+class RecordingSink(NullSink):
+    """
+    Keeps a copy of each output with the tick it was played at in waves, the
+    last keep of them if keep is given.
+    """
+
+    def __init__(self, sample_rate=44100, channels=2, keep=None):
+        super().__init__(sample_rate, channels)
+        self.waves = deque(maxlen=keep)
+
+    def output(self, wave):
+        super().output(wave)
+        if wave is not None:
+            wave = wave.copy()
+        self.waves.append((self.get_ticks(), wave))
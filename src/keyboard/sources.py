@@ -0,0 +1,270 @@
+import heapq
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+from .backend import init_midi
+
+# Captured midi files are MAGIC followed by one EVENT_DTYPE record per event.
+MAGIC = b'KMID\x01'
+EVENT_DTYPE = np.dtype([
+    ('status', 'u1'),
+    ('data1', 'u1'),
+    ('data2', 'u1'),
+    ('data3', 'u1'),
+    ('time', '<u4'),
+])
+
+
+def pack_events(midi_events):
+    """ Turn pygame style [[status, data1, data2, data3], time] events into records """
+    records = np.zeros(len(midi_events), dtype=EVENT_DTYPE)
+    for i, ([status, data1, data2, data3], time) in enumerate(midi_events):
+        records[i] = (status, data1, data2, data3, int(time))
+    return records
+
+
+def unpack_events(records):
+    return [[[int(r['status']), int(r['data1']), int(r['data2']), int(r['data3'])],
+             int(r['time'])] for r in records]
+
+
+def save_events(path, midi_events):
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(pack_events(midi_events).tobytes())
+
+
+def load_events(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a midi capture: {}".format(path))
+        return np.frombuffer(f.read(), dtype=EVENT_DTYPE)
+
+
+class MidiSource:
+    """
+    Somewhere KeyboardMidi reads events from.
+
+    Events look like pygame.midi's: [[status, data1, data2, data3], time]
+    with time in milliseconds on the source's clock, which time() reads.
+    """
+
+    def poll(self):
+        """ Return whether any events are waiting """
+        raise NotImplementedError()
+
+    def read(self, count):
+        """ Return up to count waiting events """
+        raise NotImplementedError()
+
+    def time(self):
+        raise NotImplementedError()
+
+    def done(self):
+        """ Return whether the source will never have another event """
+        return False
+
+    def close(self):
+        pass
+
+
+class PygameMidiSource(MidiSource):
+    """
+    A midi device, the default input device if dev isn't given. Devices that
+    can't be opened raise IOError. pygame's midi is shut down once every
+    device opened is closed.
+    """
+    opened = 0
+
+    def __init__(self, dev=None):
+        self.pygame = init_midi()
+        self.pygame.fastevent.init()
+        self.dev = self.pygame.midi.get_default_input_id() if dev is None else dev
+        self.input = None
+        try:
+            self.check_dev()
+            try:
+                self.input = self.pygame.midi.Input(self.dev)
+            except self.pygame.midi.MidiException as err:
+                raise IOError('Midi device {}: {}'.format(self.dev, err)) from err
+        except IOError:
+            if PygameMidiSource.opened == 0:
+                self.pygame.midi.quit()
+            raise
+        PygameMidiSource.opened += 1
+
+    def check_dev(self):
+        if self.dev == -1:
+            raise IOError("No Midi device found")
+
+    def poll(self):
+        return self.input.poll()
+
+    def read(self, count):
+        return self.input.read(count)
+
+    def time(self):
+        return self.pygame.midi.time()
+
+    def close(self):
+        if self.input is None:
+            return
+        self.input.close()
+        self.input = None
+        PygameMidiSource.opened -= 1
+        if PygameMidiSource.opened == 0:
+            self.pygame.midi.quit()
+
+
+class RecordingSource(MidiSource):
+    """ Passes events through from another source while saving them to path """
+
+    def __init__(self, source, path):
+        self.source = source
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.count = 0
+
+    def poll(self):
+        return self.source.poll()
+
+    def read(self, count):
+        midi_events = self.source.read(count)
+        self.file.write(pack_events(midi_events).tobytes())
+        self.count += len(midi_events)
+        return midi_events
+
+    def time(self):
+        return self.source.time()
+
+    def done(self):
+        return self.source.done()
+
+    def close(self):
+        self.source.close()
+        self.file.close()
+
+
+class ReplaySource(MidiSource):
+    """
+    Plays back events saved by RecordingSource or save_events.
+
+    speed scales how fast the capture plays: 1 is as recorded, 2 twice as
+    fast and None as fast as events can be read. Events are timestamped
+    with when they came due on clock, a function returning milliseconds, so
+    they can be given the clock of whatever plays them.
+    """
+
+    def __init__(self, path, speed=1, clock=None):
+        events = load_events(path)
+        self.events = events[np.argsort(events['time'], kind='stable')]
+        self.speed = speed or None
+        self.clock = clock if clock is not None else (lambda: perf_counter()*1000)
+        self.index = 0
+        self.started = None
+
+    def due(self):
+        """ Return the index one past the last event that has come due """
+        if self.started is None:
+            self.started = self.clock()
+        if self.speed is None:
+            return len(self.events)
+        first = int(self.events['time'][0]) if len(self.events) else 0
+        recorded = first + (self.clock() - self.started)*self.speed
+        return int(np.searchsorted(self.events['time'], recorded, side='right'))
+
+    def poll(self):
+        return self.index < self.due()
+
+    def read(self, count):
+        end = min(self.due(), self.index + count)
+        records = self.events[self.index:end]
+        self.index = end
+        midi_events = unpack_events(records)
+        if self.speed is None:
+            now = int(self.clock())
+            for e in midi_events:
+                e[1] = now
+        else:
+            first = int(self.events['time'][0])
+            for e in midi_events:
+                e[1] = int(self.started + (e[1] - first)/self.speed)
+        return midi_events
+
+    def time(self):
+        return self.clock()
+
+    def done(self):
+        return self.index >= len(self.events)
+
+
+class MergedSource(MidiSource):
+    """
+    Reads several sources as one, such as a keyboard, a pedal unit and pads.
+
+    Whatever is waiting on any source is taken into a heap and read back in
+    timestamp order, so events from different devices interleave as they
+    were played. The sources have to share a clock, which time() reads from
+    the first one.
+
+    Per source, by index into sources, events counts what was read,
+    pending what is waiting in the heap and lags the last window lags, in
+    milliseconds from an event's timestamp to when it was read. A source
+    that lags behind the others shows up there.
+    """
+
+    def __init__(self, sources, names=None, window=1000):
+        self.sources = list(sources)
+        self.names = [str(i) for i in range(len(self.sources))] if names is None else list(names)
+        self.heap = []
+        self.serial = 0
+        self.events = [0]*len(self.sources)
+        self.pending = [0]*len(self.sources)
+        self.lags = [deque(maxlen=window) for _ in self.sources]
+
+    def fill(self, count):
+        """ Move everything waiting on the sources into the heap """
+        for index, source in enumerate(self.sources):
+            while source.poll():
+                midi_events = source.read(count)
+                for e in midi_events:
+                    self.serial += 1
+                    heapq.heappush(self.heap, (e[1], self.serial, index, e))
+                self.pending[index] += len(midi_events)
+
+    def poll(self):
+        return len(self.heap) > 0 or any(source.poll() for source in self.sources)
+
+    def read(self, count):
+        self.fill(count)
+        now = self.time()
+        midi_events = []
+        while len(self.heap) > 0 and len(midi_events) < count:
+            time, _, index, e = heapq.heappop(self.heap)
+            self.pending[index] -= 1
+            self.events[index] += 1
+            self.lags[index].append(max(now - time, 0))
+            midi_events.append(e)
+        return midi_events
+
+    def time(self):
+        return self.sources[0].time()
+
+    def done(self):
+        return len(self.heap) == 0 and all(source.done() for source in self.sources)
+
+    def close(self):
+        for source in self.sources:
+            source.close()
+
+    def report(self):
+        """ A line per source with its events, pending events and p50/max lag """
+        lines = ['{:12} {:>7} {:>7} {:>9} {:>9}'.format('source', 'events', 'pending',
+                                                        'p50 ms', 'max ms')]
+        for name, events, pending, lags in zip(self.names, self.events, self.pending, self.lags):
+            p50 = float(np.percentile(lags, 50)) if lags else 0
+            lines.append('{:12} {:7} {:7} {:9.1f} {:9.1f}'.format(
+                name, events, pending, p50, max(lags, default=0)))
+        return '\n'.join(lines)
@@ -0,0 +1,92 @@
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+
+class LatencyStats:
+    """
+    Rolling latency histograms for the path from a midi event to Sound.play.
+
+    One event runs from begin() to end(). In between, each lap(stage) adds
+    the time since the previous lap to that stage, so the stages of an event
+    add up to its total. Events read together from midi are timed as one,
+    with each of their waits recorded separately. The last window samples
+    are kept per stage.
+
+    Stages:
+    * wait: from the midi timestamp until the event was read
+    * read: reading the events from the midi source
+    * update: KeyboardPlayer working out what to start and stop
+    * synth: rendering the waves of new notes
+    * mix: adding and removing voices and scaling the mix
+    * convert: int16 conversion
+    * play: handing the wave to the sink, for pygame building the Sound,
+      starting it and stopping the old one
+    * total: the longest wait plus everything up to end()
+
+    Components only time anything when given a LatencyStats, or anything
+    else with its begin, lap, record and end like a Tracer, so leaving it
+    out costs one attribute check per stage.
+    """
+    STAGES = ('wait', 'read', 'update', 'synth', 'mix', 'convert', 'play', 'total')
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {stage: deque(maxlen=window) for stage in LatencyStats.STAGES}
+        self.current = None
+        self.mark = None
+        self.started = None
+        self.wait = 0
+
+    def begin(self, wait=0):
+        """ Start timing an event that waited wait seconds to be read """
+        self.current = {}
+        self.wait = wait
+        self.started = self.mark = perf_counter()
+
+    def lap(self, stage):
+        if self.current is None:
+            return
+        now = perf_counter()
+        self.current[stage] = self.current.get(stage, 0) + now - self.mark
+        self.mark = now
+
+    def end(self):
+        if self.current is None:
+            return
+        for stage, seconds in self.current.items():
+            self.record(stage, seconds)
+        self.record('total', self.wait + perf_counter() - self.started)
+        self.current = None
+
+    def record(self, stage, seconds, started=None):
+        """ Add seconds to stage, which began at started if known (for traces) """
+        self.samples[stage].append(seconds)
+
+    def percentiles(self, stage):
+        """ Return {'count', 'p50', 'p95', 'p99'} for stage, in seconds """
+        samples = self.samples[stage]
+        result = {'count': len(samples)}
+        for q in LatencyStats.PERCENTILES:
+            key = 'p{}'.format(q)
+            result[key] = float(np.percentile(samples, q)) if samples else None
+        return result
+
+    def summary(self):
+        return {stage: self.percentiles(stage) for stage in LatencyStats.STAGES}
+
+    def report(self):
+        lines = ['{:8} {:>6} {:>9} {:>9} {:>9}'.format('stage', 'count', 'p50 ms', 'p95 ms', 'p99 ms')]
+        for stage, result in self.summary().items():
+            if result['count'] == 0:
+                continue
+            lines.append('{:8} {:6} {:9.3f} {:9.3f} {:9.3f}'.format(
+                stage, result['count'], result['p50']*1000, result['p95']*1000,
+                result['p99']*1000))
+        return '\n'.join(lines)
+
+    def clear(self):
+        for samples in self.samples.values():
+            samples.clear()
@@ -0,0 +1,136 @@
+"""
+Profiling a session without changing the code that runs it.
+
+A Tracer goes wherever a LatencyStats does and turns each lap into a named
+span, which can be saved as a Chrome trace and opened in chrome://tracing or
+Perfetto. A Profile runs a session under a Tracer or cProfile and writes
+what it saw when closed.
+"""
+import cProfile
+import json
+import os
+import threading
+from collections import deque
+from time import perf_counter
+
+
+class Tracer:
+    """
+    Records the stages timed by begin, lap and record (see LatencyStats) as
+    spans of (stage, start, seconds, thread). lap spans run from the previous
+    lap and record spans from their started, else they end when recorded.
+    The hot path stages are read (midi read), update (keyboard update),
+    synth (voice synth), mix, convert and play (output). wait and total are
+    latencies rather than work and aren't traced.
+
+    Tracing can be switched off and on while running with enabled, which
+    doesn't affect stats. The last limit spans are kept.
+    """
+    LATENCIES = ('wait', 'total')
+
+    def __init__(self, stats=None, limit=1000000, enabled=True):
+        self.stats = stats
+        self.enabled = enabled
+        self.spans = deque(maxlen=limit)
+        self.mark = None
+        self.origin = perf_counter()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+
+    def begin(self, wait=0):
+        self.mark = perf_counter()
+        if self.stats is not None:
+            self.stats.begin(wait)
+
+    def lap(self, stage):
+        if self.stats is not None:
+            self.stats.lap(stage)
+        if self.mark is None:
+            return
+        now = perf_counter()
+        if self.enabled:
+            self.spans.append((stage, self.mark, now - self.mark, threading.get_ident()))
+        self.mark = now
+
+    def record(self, stage, seconds, started=None):
+        if self.stats is not None:
+            self.stats.record(stage, seconds, started)
+        if self.enabled and stage not in Tracer.LATENCIES:
+            if started is None:
+                started = perf_counter() - seconds
+            self.spans.append((stage, started, seconds, threading.get_ident()))
+
+    def end(self):
+        self.mark = None
+        if self.stats is not None:
+            self.stats.end()
+
+    def chrome_trace(self):
+        """ Return the spans in the Chrome trace event format """
+        pid = os.getpid()
+        events = [{'name': stage, 'ph': 'X', 'pid': pid, 'tid': thread,
+                   'ts': (start - self.origin)*1e6, 'dur': seconds*1e6}
+                  for stage, start, seconds, thread in self.spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def clear(self):
+        self.spans.clear()
+
+
+class Profile:
+    """
+    Profiles a session into path: a Chrome trace of the stages if path ends
+    with .json, else cProfile's pstats of every call. cProfile only sees the
+    thread that calls start(), so synth done in worker threads shows in the
+    trace but not in pstats. Components are given get_stats() in place of
+    stats. The profile runs between start() and close(), and toggle()
+    pauses and resumes it.
+    """
+
+    def __init__(self, path, stats=None):
+        self.path = path
+        self.stats = stats
+        self.tracer = None
+        self.profiler = None
+        if str(path).lower().endswith('.json'):
+            self.tracer = Tracer(stats, enabled=False)
+        else:
+            self.profiler = cProfile.Profile()
+        self.enabled = False
+
+    def get_stats(self):
+        return self.stats if self.tracer is None else self.tracer
+
+    def start(self):
+        self.enabled = True
+        if self.tracer is not None:
+            self.tracer.enabled = True
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        self.enabled = False
+        if self.tracer is not None:
+            self.tracer.enabled = False
+        else:
+            self.profiler.disable()
+
+    def toggle(self):
+        if self.enabled:
+            self.stop()
+        else:
+            self.start()
+
+    def close(self):
+        """ Stop profiling and write the profile """
+        if self.enabled:
+            self.stop()
+        if self.tracer is not None:
+            self.tracer.write(self.path)
+        else:
+            self.profiler.dump_stats(self.path)
@@ -0,0 +1,130 @@
+"""
+Tunings turn scale degrees counted from a root into frequency ratios.
+
+Degrees are NumPy arrays so a whole keyboard is tuned in one go. A degree of
+nan means the key has no pitch and gives a nan ratio.
+"""
+from fractions import Fraction
+
+import numpy as np
+
+
+def parse_ratio(value):
+    """ Parse a ratio like 5/4, 3 or 1.25 into a float """
+    return float(Fraction(str(value).strip()))
+
+
+class EdoTuning:
+    """ Equal divisions of the period, 12 steps to an octave by default """
+
+    def __init__(self, divisions=12, period=2):
+        self.divisions = divisions
+        self.period = parse_ratio(period)
+        self.size = divisions
+
+    def get_key(self):
+        return (EdoTuning, self.divisions, self.period)
+
+    def ratios(self, degrees):
+        degrees = np.asarray(degrees, dtype=np.float64)
+        return np.power(self.period, degrees/self.divisions)
+
+
+class RatioTuning:
+    """
+    A scale of frequency ratios repeating every period, like just
+    intonation. ratios are the degrees of one period starting from 1.
+    """
+
+    def __init__(self, ratios, period=2):
+        self.degrees = np.array([parse_ratio(ratio) for ratio in ratios])
+        self.period = parse_ratio(period)
+        self.size = len(self.degrees)
+
+    def get_key(self):
+        return (RatioTuning, tuple(self.degrees.tolist()), self.period)
+
+    def ratios(self, degrees):
+        degrees = np.asarray(degrees, dtype=np.float64)
+        result = np.full(degrees.shape, np.nan)
+        valid = ~np.isnan(degrees)
+        steps = degrees[valid].astype(np.int64)
+        result[valid] = self.degrees[steps % self.size] * self.period**(steps // self.size)
+        return result
+
+    @classmethod
+    def from_scl(cls, path):
+        """ Read a Scala scale file """
+        lines = read_scala_lines(path)
+        count = int(lines[1].split()[0])
+        pitches = []
+        for line in lines[2:2+count]:
+            value = line.split()[0]
+            if '.' in value:
+                pitches.append(2**(float(value)/1200))  # cents
+            else:
+                pitches.append(parse_ratio(value))
+        if len(pitches) != count:
+            raise ValueError("Expected {} pitches in {}".format(count, path))
+        return cls([1] + pitches[:-1], pitches[-1])
+
+
+class KeyMapping:
+    """
+    Which scale degree each key plays, as in a Scala keyboard mapping.
+
+    Keys are numbered from A0 like KeySet keys, while the file numbers them
+    as midi notes. middle is the key that plays the root, reference_key and
+    reference_freq pin the frequency. mapping gives the degree of each key
+    in a repeating block of len(mapping) keys, None for keys that don't
+    play, and each block moves up octave_degree degrees (the scale's size if
+    0). An empty mapping maps keys to degrees one to one.
+    """
+    MIDI_A0 = 21
+
+    def __init__(self, mapping=(), middle=39, reference_key=48, reference_freq=440,
+                 first=0, last=127, octave_degree=0):
+        self.mapping = list(mapping)
+        self.middle = middle
+        self.reference_key = reference_key
+        self.reference_freq = reference_freq
+        self.first = first
+        self.last = last
+        self.octave_degree = octave_degree
+
+    def get_key(self):
+        return (KeyMapping, tuple(self.mapping), self.middle, self.reference_key,
+                self.reference_freq, self.first, self.last, self.octave_degree)
+
+    def degrees(self, keys, scale_size):
+        keys = np.asarray(keys, dtype=np.int64)
+        offset = keys - self.middle
+        if len(self.mapping) == 0:
+            degrees = offset.astype(np.float64)
+        else:
+            size = len(self.mapping)
+            table = np.array([np.nan if d is None else d for d in self.mapping], dtype=np.float64)
+            octave_degree = self.octave_degree or scale_size
+            degrees = table[offset % size] + (offset // size)*octave_degree
+        degrees[(keys < self.first) | (keys > self.last)] = np.nan
+        return degrees
+
+    @classmethod
+    def from_kbm(cls, path):
+        """ Read a Scala keyboard mapping file """
+        lines = read_scala_lines(path)
+        values = [line.split()[0] for line in lines]
+        size, first, last, middle, reference = (int(v) for v in values[:5])
+        reference_freq = float(values[5])
+        octave_degree = int(values[6])
+        mapping = [None if v in ('x', 'X') else int(v) for v in values[7:7+size]]
+        mapping += [None]*(size - len(mapping))
+        a0 = KeyMapping.MIDI_A0
+        return cls(mapping, middle - a0, reference - a0, reference_freq,
+                   first - a0, last - a0, octave_degree)
+
+
+def read_scala_lines(path):
+    """ The lines of a Scala file without comments """
+    with open(path, encoding='latin-1') as f:
+        return [line.rstrip('\n') for line in f if not line.startswith('!')]
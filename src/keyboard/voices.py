@@ -0,0 +1,77 @@
+class Voice:
+    __slots__ = ('note', 'time', 'serial')
+
+    def __init__(self):
+        self.note = None
+        self.time = None
+        self.serial = 0
+
+    def get_level(self, now):
+        """ The note's level now, now being in milliseconds like time """
+        return self.note.get_level(max(now - self.time, 0)/1000)
+
+
+class VoicePool:
+    """
+    A fixed number of voices for notes to sound on.
+
+    When every voice is taken, acquiring one steals it from another note:
+    either the one that started first ('oldest') or the one whose level is
+    lowest at the time of the steal ('quietest').
+    """
+    STEAL_MODES = ('oldest', 'quietest')
+
+    def __init__(self, size, steal='oldest'):
+        if size < 1:
+            raise ValueError("Voice pool needs at least one voice.")
+        if steal not in VoicePool.STEAL_MODES:
+            raise ValueError("Unknown steal mode: {}".format(steal))
+        self.size = size
+        self.steal = steal
+        self.voices = [Voice() for _ in range(size)]
+        self.free = list(self.voices)
+        self.active = {}
+        self.serial = 0
+        self.stolen = 0
+
+    def __len__(self):
+        return len(self.active)
+
+    def __contains__(self, note):
+        return note in self.active
+
+    def acquire(self, note, time, now=None):
+        """
+        Give note a voice. Returns the note whose voice was stolen for it, or
+        None if a voice was free.
+        """
+        stolen = None
+        if note in self.active:
+            voice = self.active[note]
+        elif len(self.free) > 0:
+            voice = self.free.pop()
+        else:
+            voice = self.choose(time if now is None else now)
+            stolen = voice.note
+            del self.active[stolen]
+            self.stolen += 1
+        self.serial += 1
+        voice.note = note
+        voice.time = time
+        voice.serial = self.serial
+        self.active[note] = voice
+        return stolen
+
+    def release(self, note):
+        voice = self.active.pop(note, None)
+        if voice is None:
+            return
+        voice.note = None
+        voice.time = None
+        self.free.append(voice)
+
+    def choose(self, now):
+        if self.steal == 'quietest':
+            return min(self.active.values(),
+                       key=lambda v: (v.get_level(now), v.time, v.serial))
+        return min(self.active.values(), key=lambda v: (v.time, v.serial))
@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from math import isnan
+
+import numpy as np
+
+from .player import make_note, render_note
+
+
+class WaveBank:
+    """
+    A cache of rendered waves that notes can share.
+
+    Notes that can be cached return a key from get_wave_key(). The bank adds
+    the player's sample rate and dtype to that key, so a wave is only reused
+    when it would come out sample for sample identical.
+
+    Waves are stored read only and evicted least recently used first once
+    their total size goes over max_bytes.
+
+    With a DiskWaveBank as disk, waves missing from memory are looked up on
+    disk before being rendered, and rendered waves are saved there, so they
+    are only rendered once across runs. Waves mapped from disk are kept in
+    mapped, outside max_bytes, since the OS can drop their pages whenever
+    it needs the memory. hits and misses count what was found in the bank
+    and what had to be rendered, the disk counts its own hits.
+    """
+
+    def __init__(self, max_bytes=256*2**20, volume_buckets=16, disk=None):
+        self.max_bytes = max_bytes
+        self.volume_buckets = volume_buckets
+        self.disk = disk
+        self.waves = OrderedDict()
+        self.mapped = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.waves) + len(self.mapped)
+
+    def __contains__(self, key):
+        return key in self.waves or key in self.mapped
+
+    def quantize(self, volume):
+        """
+        Round a velocity in [0, 127] to the top of its bucket so that nearby
+        velocities share a wave. 0 stays silent.
+        """
+        if volume <= 0:
+            return 0
+        bucket = min(int(volume), 127)*self.volume_buckets//128
+        return (bucket+1)*128//self.volume_buckets - 1
+
+    def get_key(self, note, player):
+        key = note.get_wave_key()
+        if key is None:
+            return None
+        return key + (player.sample_rate, player.dtype.str)
+
+    def load(self, note, player):
+        """
+        Set the wave of note, rendering it with player's time grid only if no
+        equivalent wave is in the bank.
+        """
+        wave = self.fetch(note, player)
+        if wave is None:
+            wave = render_note(note, player)
+            self.keep(note, player)
+        return wave
+
+    def fetch(self, note, player):
+        """ Set and return the wave of note if the bank has it, else None """
+        key = self.get_key(note, player)
+        if key is None:
+            return None
+        wave = self.waves.get(key)
+        if wave is not None:
+            self.waves.move_to_end(key)
+        else:
+            wave = self.mapped.get(key)
+        if wave is not None:
+            self.hits += 1
+        elif self.disk is not None:
+            wave = self.disk.get(key)
+            if wave is not None:
+                self.mapped[key] = wave
+        if wave is not None:
+            note.wave = wave
+        return wave
+
+    def keep(self, note, player):
+        """ Store the wave note has rendered """
+        key = self.get_key(note, player)
+        if key is None:
+            return
+        self.misses += 1
+        wave = note.get_wave()
+        if self.disk is not None:
+            wave = self.disk.put(key, wave)
+            note.wave = wave
+        wave.flags.writeable = False
+        if isinstance(wave, np.memmap):
+            self.mapped[key] = wave
+        else:
+            self.store(key, wave)
+
+    def store(self, key, wave):
+        if wave.nbytes > self.max_bytes:
+            return
+        if key in self.waves:
+            self.size -= self.waves.pop(key).nbytes
+        self.waves[key] = wave
+        self.size += wave.nbytes
+        while self.size > self.max_bytes:
+            _, old = self.waves.popitem(last=False)
+            self.size -= old.nbytes
+
+    def warm_up(self, keyset, player, num_keys=88, volumes=(127,), fade=True,
+                envelope=None, partials=None):
+        """
+        Render every key of keyset ahead of time so the first press of each
+        key doesn't have to.
+        """
+        for key in range(num_keys):
+            freq = keyset.get_freq(key)
+            if isnan(freq):
+                continue
+            for volume in volumes:
+                volume = self.quantize(volume)
+                note = make_note((freq, volume), freq, volume, fade, envelope, partials)
+                self.load(note, player)
+
+    def clear(self):
+        self.waves.clear()
+        self.mapped.clear()
+        self.size = 0
@@ -0,0 +1,57 @@
+"""
+Single cycle wavetables for additive timbres.
+
+A spectrum of harmonic amplitudes is turned into one cycle of samples with
+an inverse FFT once and cached, then read at any frequency by interpolating
+between table samples. Reading costs the same however many partials the
+spectrum has.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+# a power of two so phases wrap with a mask
+TABLE_SIZE = 4096
+
+SAWTOOTH = tuple(1/k for k in range(1, 65))
+SQUARE = tuple(1/k if k % 2 else 0 for k in range(1, 65))
+TRIANGLE = tuple((-1)**(k//2)/k**2 if k % 2 else 0 for k in range(1, 65))
+
+
+@lru_cache(maxsize=256)
+def harmonic_table(partials, size=TABLE_SIZE):
+    """
+    Return (table, slopes) for one cycle of the sum of partials[k-1] *
+    sin(2 pi k t). slopes[i] is table[i+1] - table[i] across the wrap.
+    partials has to be a tuple so tables are cached by spectrum.
+    """
+    spectrum = np.zeros(size//2 + 1, dtype=np.complex128)
+    spectrum[1:len(partials)+1] = np.asarray(partials, dtype=np.float64)*(-.5j*size)
+    table = np.fft.irfft(spectrum, size)
+    slopes = np.roll(table, -1) - table
+    table.flags.writeable = False
+    slopes.flags.writeable = False
+    return table, slopes
+
+
+def band_limit(partials, frequency, sample_rate):
+    """ Drop the partials at or above the Nyquist frequency """
+    count = int(np.ceil(sample_rate/2/frequency)) - 1
+    return tuple(partials[:max(count, 0)])
+
+
+def read_table(table, slopes, frequency, x):
+    """
+    Read a table at frequency for times x, interpolating linearly. The phase
+    at each time is frequency*x, what a phase accumulator would have summed
+    to, so reads can start at any time.
+    """
+    size = table.shape[0]
+    position = x*(frequency*size)
+    index = position.astype(np.intp)
+    position -= index
+    index &= size - 1
+    wave = np.take(slopes, index)
+    wave *= position
+    wave += np.take(table, index)
+    return wave
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import keyboard
+
+
+class FakePlayer:
+    """ What notes and wave banks need of a Player to render """
+    sample_rate = 1000
+    channels = 2
+    dtype = np.dtype(np.float64)
+
+    def sub_x(self, time, offset=0):
+        return keyboard.time_axis(int(time*self.sample_rate), self.sample_rate, offset)
+
+
+class TempDirTestCase(unittest.TestCase):
+    """ A TestCase with a temporary directory to write files to """
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, data):
+        """ Write data, bytes or text, to name in the directory and return its path """
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        return path
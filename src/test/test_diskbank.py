@@ -0,0 +1,70 @@
+import os
+from unittest import mock
+
+import numpy as np
+
+import keyboard
+from . import FakePlayer, TempDirTestCase
+
+
+class TestDiskWaveBank(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = self.dir.name
+        self.wave = np.arange(100, dtype=np.float64).reshape(-1, 1)
+
+    def test_persists(self):
+        keyboard.DiskWaveBank(self.path).put(('a', 1), self.wave)
+        disk = keyboard.DiskWaveBank(self.path)
+        wave = disk.get(('a', 1))
+        self.assertIsInstance(wave, np.memmap)
+        self.assertFalse(wave.flags.writeable)
+        np.testing.assert_array_equal(wave, self.wave)
+        self.assertIsNone(disk.get(('a', 2)))
+        self.assertEqual((disk.hits, disk.misses), (1, 1))
+
+    def test_eviction(self):
+        disk = keyboard.DiskWaveBank(self.path)
+        disk.put(('a',), self.wave)
+        file_bytes = disk.size
+        disk.max_bytes = 2*file_bytes
+        disk.put(('b',), self.wave)
+        disk.get(('a',))
+        disk.put(('c',), self.wave)
+        self.assertEqual(len(disk), 2)
+        self.assertEqual(len(os.listdir(self.path)), 2)
+        self.assertIsNone(disk.get(('b',)))
+        self.assertIsNotNone(disk.get(('a',)))
+
+    def test_version(self):
+        keyboard.DiskWaveBank(self.path).put(('a',), self.wave)
+        with mock.patch.object(keyboard.DiskWaveBank, 'VERSION', 2):
+            self.assertIsNone(keyboard.DiskWaveBank(self.path).get(('a',)))
+
+    def test_corrupt(self):
+        disk = keyboard.DiskWaveBank(self.path)
+        disk.put(('a',), self.wave)
+        with open(os.path.join(self.path, disk.get_name(('a',))), 'wb') as f:
+            f.write(b'not a wave')
+        self.assertIsNone(disk.get(('a',)))
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_wave_bank(self):
+        player = FakePlayer()
+        bank = keyboard.WaveBank(disk=keyboard.DiskWaveBank(self.path))
+        expected = bank.load(keyboard.PlayerBasicNote(1, 440, 127), player)
+        self.assertEqual(bank.misses, 1)
+
+        disk = keyboard.DiskWaveBank(self.path)
+        bank = keyboard.WaveBank(disk=disk)
+        note = keyboard.PlayerBasicNote(2, 440, 127)
+        wave = bank.load(note, player)
+        self.assertEqual((bank.hits, bank.misses), (0, 0))
+        self.assertEqual(disk.hits, 1)
+        self.assertIsInstance(note.get_wave(), np.memmap)
+        np.testing.assert_array_equal(wave, expected)
+        # mapped waves don't take up the memory budget
+        self.assertEqual(bank.size, 0)
+        self.assertIn(bank.get_key(note, player), bank)
+        bank.load(keyboard.PlayerBasicNote(3, 440, 127), player)
+        self.assertEqual((bank.hits, disk.hits), (1, 1))
@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+
+import keyboard
+
+
+class TestEnvelope(unittest.TestCase):
+    def test_exp(self):
+        envelope = keyboard.ExpEnvelope(.5, threshold=1e-3)
+        np.testing.assert_allclose(envelope.levels([0, .5]), [1, np.exp(-1)])
+        hold = envelope.get_hold_time()
+        self.assertAlmostEqual(envelope.levels(hold), 1e-3)
+        self.assertLess(envelope.get_hold_time(.1), hold)
+        self.assertEqual(envelope.get_release_time(1), 0)
+
+    def test_adsr(self):
+        envelope = keyboard.ADSREnvelope(.1, .2, .5, .3)
+        np.testing.assert_allclose(envelope.levels([0, .05, .1]), [0, .5, 1])
+        self.assertAlmostEqual(float(envelope.levels(10)), .5)
+        self.assertIsNone(envelope.get_hold_time())
+        release = envelope.get_release_time(.5)
+        self.assertAlmostEqual(float(envelope.release_levels(release, .5)), envelope.threshold)
+
+    def test_adsr_without_sustain(self):
+        envelope = keyboard.ADSREnvelope(.1, .2, 0, .3)
+        hold = envelope.get_hold_time()
+        self.assertAlmostEqual(float(envelope.levels(hold)), envelope.threshold)
+
+    def test_note_duration(self):
+        self.assertLess(keyboard.PlayerBasicNote(0, 440, 127).get_duration(), 7)
+        self.assertLess(keyboard.PlayerBasicNote(0, 440, 20).get_duration(),
+                        keyboard.PlayerBasicNote(0, 440, 127).get_duration())
+        self.assertEqual(keyboard.PlayerBasicNote(0, 440, 127, fade=False).get_duration(), 7)
+        envelope = keyboard.ADSREnvelope()
+        self.assertEqual(keyboard.PlayerBasicNote(0, 440, 127, envelope=envelope).get_duration(), 7)
+
+    def test_sustain_fades_at_cap(self):
+        # a held note is let go of before the cap instead of being cut off there
+        envelope = keyboard.ADSREnvelope()
+        note = keyboard.PlayerBasicNote(0, 440, 127, envelope=envelope, duration=3)
+        self.assertAlmostEqual(float(note.get_level(1)), float(envelope.levels(1)))
+        self.assertLess(float(note.get_level(2.5)), .5)
+        self.assertAlmostEqual(float(note.get_level(3)), envelope.threshold, places=5)
+
+
+class TestRelease(unittest.TestCase):
+    def setUp(self):
+        self.sink = keyboard.RecordingSink(sample_rate=8000)
+        self.player = keyboard.Player(sink=self.sink, max_voices=4)
+        self.envelope = keyboard.ADSREnvelope(0, .1, .5, .1)
+
+    def test_release(self):
+        note = keyboard.PlayerBasicNote(0, 440, 127, envelope=self.envelope)
+        self.player.start(note, 0, 0)
+        self.player.release(note, 500)
+        self.assertNotIn(note, self.player.notes)
+        self.assertIn(note, self.player.mixer)
+        self.assertIn(note, self.player.pool)
+        tail = self.player.mixer.read(self.player.to_sample(500))
+        length = note.get_release_time(.5)
+        self.assertEqual(tail.shape[0], int(length*8000))
+        self.assertAlmostEqual(np.abs(tail[:8, 0]).max(), .5, places=1)
+        self.assertLess(np.abs(tail[-8:, 0]).max(), 1e-3)
+        self.player.retire(500 + length*1000 + 1)
+        self.assertNotIn(note, self.player.mixer)
+        self.assertNotIn(note, self.player.pool)
+
+    def test_retired_when_silent(self):
+        note = keyboard.PlayerBasicNote(0, 440, 127)
+        self.player.start(note, 0, 0)
+        self.player.retire(note.get_duration()*1000 - 10)
+        self.assertIn(note, self.player.notes)
+        self.player.retire(note.get_duration()*1000 + 1)
+        self.assertNotIn(note, self.player.notes)
+        self.assertEqual(len(self.player.mixer), 0)
+        self.assertEqual(len(self.player.pool), 0)
+
+    def test_no_release(self):
+        note = keyboard.PlayerBasicNote(0, 440, 127)
+        self.player.start(note, 0, 0)
+        self.player.release(note, 100)
+        self.assertEqual(len(self.player.mixer), 0)
+
+    def test_render(self):
+        renderer = keyboard.OfflineRenderer(sample_rate=8000)
+        note = keyboard.PlayerBasicNote(0, 440, 127, envelope=self.envelope)
+        renderer.play(note, 0)
+        renderer.stop(note, 500)
+        out = renderer.render(np.float32)
+        length = int(note.get_release_time(.5)*8000)
+        self.assertEqual(out.shape[0], 4000 + length)
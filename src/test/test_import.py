@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import unittest
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds importing the package may take. It should only cost numpy.
+IMPORT_BUDGET = 1.0
+
+
+def run(code):
+    out = subprocess.run([sys.executable, '-c', code], cwd=SRC, check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True)
+    return out.stdout.split()
+
+
+class TestImport(unittest.TestCase):
+    def test_import_time(self):
+        elapsed, = run("import time; start = time.perf_counter(); import keyboard; "
+                       "print(time.perf_counter() - start)")
+        self.assertLess(float(elapsed), IMPORT_BUDGET)
+
+    def test_no_pygame(self):
+        loaded, key = run("import sys, keyboard; "
+                          "key = keyboard.KeySetBuilder().build().get_freq(keyboard.Note('C4').get_key()); "
+                          "print('pygame' in sys.modules, round(key))")
+        self.assertEqual(loaded, 'False')
+        self.assertEqual(key, '262')
+
+    def test_cli_help(self):
+        out = run("import runpy, sys; sys.argv = ['keyboard', 'note', '--help']\n"
+                  "try:\n"
+                  "    runpy.run_module('keyboard', run_name='__main__')\n"
+                  "except SystemExit:\n"
+                  "    pass\n"
+                  "print('pygame' in sys.modules)")
+        self.assertEqual(out[-1], 'False')
@@ -0,0 +1,270 @@
+import asyncio
+import unittest
+
+import keyboard
+
+
+class RecordingPlayer:
+    bank = None
+
+    def __init__(self):
+        self.playing = set()
+
+    def play_all(self, notes, times=None):
+        self.playing.update(note.note_id for note in notes)
+
+    def stop_all(self, notes):
+        self.playing.difference_update(note.note_id for note in notes)
+
+
+class Observer:
+    def __init__(self):
+        self.changes = []
+
+    def update(self, keyboard, changes=None):
+        self.changes.append(changes)
+
+
+class TestKeyboard(unittest.TestCase):
+    def make_keyboard(self):
+        return keyboard.Keyboard()
+
+    def setUp(self):
+        self.keyboard = self.make_keyboard()
+        self.observer = Observer()
+        self.keyboard.watch(self.observer)
+
+    def test_idle(self):
+        self.keyboard.notify()
+        self.assertEqual(self.observer.changes, [])
+
+    def test_press_release(self):
+        self.keyboard.press(40, 100, 5)
+        self.keyboard.notify()
+        self.keyboard.release(40)
+        self.keyboard.notify()
+        self.keyboard.notify()
+        pressed, released = self.observer.changes
+        self.assertEqual(pressed.pressed, [(40, 100, 5)])
+        self.assertEqual(released.pressed, [])
+        self.assertEqual(released.released, {40})
+
+    def test_unheard_press(self):
+        self.keyboard.press(40, 100, 5)
+        self.keyboard.press(41, 100, 5)
+        self.keyboard.release(40)
+        self.keyboard.notify()
+        changes, = self.observer.changes
+        self.assertEqual(changes.pressed, [(41, 100, 5)])
+
+    def test_sustain(self):
+        self.keyboard.press_sustain()
+        self.keyboard.press(40, 100, 5)
+        self.keyboard.release(40)
+        self.keyboard.notify()
+        self.keyboard.release_sustain()
+        self.keyboard.notify()
+        held, released = self.observer.changes
+        self.assertEqual(held.pressed, [(40, 100, 5)])
+        self.assertEqual(held.sustained, {40})
+        self.assertEqual(held.released, set())
+        self.assertEqual(released.released, {40})
+
+
+class TestKeyboardPlayer(unittest.TestCase):
+    def make_keyboard(self):
+        return keyboard.Keyboard()
+
+    def setUp(self):
+        self.keyboard = self.make_keyboard()
+        self.player = RecordingPlayer()
+        self.keys = keyboard.KeySetBuilder().build()
+        self.keyboard_player = keyboard.KeyboardPlayer(self.keyboard, self.player, self.keys)
+        self.keyboard.watch(self.keyboard_player)
+
+    def playing_keys(self):
+        return sorted(self.keys.keys.tolist().index(freq) for freq, _, _ in self.player.playing)
+
+    def test_changes(self):
+        self.keyboard.press(40, 100, 0)
+        self.keyboard.press(44, 100, 0)
+        self.keyboard.notify()
+        self.assertEqual(self.playing_keys(), [40, 44])
+        self.keyboard.release(40)
+        self.keyboard.notify()
+        self.assertEqual(self.playing_keys(), [44])
+
+    def test_sustain(self):
+        self.keyboard.press_sustain()
+        for time in range(3):
+            self.keyboard.press(40, 100, time)
+            self.keyboard.release(40)
+            self.keyboard.notify()
+        self.assertEqual(self.playing_keys(), [40, 40, 40])
+        self.keyboard.release_sustain()
+        self.keyboard.notify()
+        self.assertEqual(self.playing_keys(), [])
+
+    def test_restrike(self):
+        self.keyboard.press(40, 100, 0)
+        self.keyboard.notify()
+        self.keyboard.release(40)
+        self.keyboard.press(40, 90, 10)
+        self.keyboard.notify()
+        self.assertEqual(self.player.playing, {(self.keys.get_freq(40), 90, 10)})
+
+    def test_sync(self):
+        self.keyboard.press(40, 100, 0)
+        self.keyboard.press(41, 100, 0)
+        self.keyboard_player.update(self.keyboard)
+        self.assertEqual(self.playing_keys(), [40, 41])
+        self.keyboard.release(41)
+        self.keyboard_player.update(self.keyboard)
+        self.assertEqual(self.playing_keys(), [40])
+        self.keyboard.release(40)
+        self.keyboard.notify()
+        self.assertEqual(self.playing_keys(), [])
+
+
+class TestArrayKeyboard(TestKeyboard):
+    def make_keyboard(self):
+        return keyboard.ArrayKeyboard(max_strikes=2)
+
+    def test_state(self):
+        self.keyboard.press_sustain()
+        self.keyboard.press(40, 100, 5)
+        self.keyboard.press(41, 90, 6)
+        self.keyboard.release(40)
+        self.assertEqual(list(self.keyboard.active_keys()), [40, 41])
+        self.assertEqual(list(self.keyboard.pressed.nonzero()[0]), [41])
+        self.assertEqual(list(self.keyboard.sustained.nonzero()[0]), [40])
+        self.assertEqual(self.keyboard.velocity[41], 90)
+        self.assertEqual(self.keyboard.onset[40], 5)
+        self.assertTrue(self.keyboard.sounding()[[40, 41]].all())
+        self.keyboard.release_sustain()
+        self.assertEqual(self.keyboard.keys, {41: [(90, 6)]})
+
+    def test_ring(self):
+        for time in range(3):
+            self.keyboard.press(40, 100, time)
+        self.keyboard.notify()
+        changes, = self.observer.changes
+        self.assertEqual(changes.pressed, [(40, 100, 1), (40, 100, 2)])
+        self.assertEqual(changes.dropped, [])
+        self.keyboard.press(40, 100, 3)
+        self.keyboard.notify()
+        self.assertEqual(self.observer.changes[1].dropped, [(40, 100, 1)])
+        self.assertEqual(self.keyboard.keys, {40: [(100, 2), (100, 3)]})
+
+    def test_out_of_range(self):
+        self.keyboard.press(-1, 100, 0)
+        self.keyboard.press(88, 100, 0)
+        self.keyboard.release(-1)
+        self.keyboard.notify()
+        self.assertEqual(self.observer.changes, [])
+
+
+class TestArrayKeyboardPlayer(TestKeyboardPlayer):
+    def make_keyboard(self):
+        return keyboard.ArrayKeyboard(max_strikes=2)
+
+    def test_sustain(self):
+        self.keyboard.press_sustain()
+        for time in range(3):
+            self.keyboard.press(40, 100, time)
+            self.keyboard.release(40)
+            self.keyboard.notify()
+        self.assertEqual(self.playing_keys(), [40, 40])
+        self.keyboard.release_sustain()
+        self.keyboard.notify()
+        self.assertEqual(self.playing_keys(), [])
+
+
+class TestKeyboardMidi(unittest.TestCase):
+    def test_order(self):
+        events = [[[144, 60, 100, 0], 20], [[144, 62, 100, 0], 10], [[128, 60, 0, 0], 30]]
+        ordered, coalesced, delayed = keyboard.KeyboardMidi.order_events(events)
+        self.assertEqual([time for _, time in ordered], [10, 20, 30])
+        self.assertEqual(coalesced, 0)
+        self.assertEqual(delayed, 1)
+
+    def test_coalesce(self):
+        events = [[[176, 64, value, 0], i] for i, value in enumerate([0, 10, 127, 127, 127, 40])]
+        events.append([[144, 60, 100, 0], 10])
+        events.append([[176, 64, 0, 0], 11])
+        ordered, coalesced, delayed = keyboard.KeyboardMidi.order_events(events)
+        self.assertEqual([e[0][2] for e in ordered], [0, 127, 40, 100, 0])
+        self.assertEqual(coalesced, 3)
+        self.assertEqual(delayed, 0)
+
+
+class TrickleSource(keyboard.MidiSource):
+    """ Lets one event through every few polls, then is done """
+
+    def __init__(self, midi_events, every=3):
+        self.midi_events = list(midi_events)
+        self.every = every
+        self.polls = 0
+        self.closed = False
+
+    def poll(self):
+        self.polls += 1
+        return len(self.midi_events) > 0 and self.polls % self.every == 0
+
+    def read(self, count):
+        midi_events, self.midi_events = self.midi_events[:1], self.midi_events[1:]
+        return midi_events
+
+    def time(self):
+        return 0
+
+    def done(self):
+        return len(self.midi_events) == 0
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncObserver:
+    def __init__(self):
+        self.changes = []
+
+    async def update(self, keyboard, changes):
+        await asyncio.sleep(0)
+        self.changes.append(changes)
+
+
+class TestAsyncKeyboardMidi(unittest.TestCase):
+    def setUp(self):
+        self.midi_events = [[[144, 60, 100, 0], 1], [[176, 64, 127, 0], 2],
+                            [[128, 60, 0, 0], 3], [[176, 64, 0, 0], 4]]
+        self.source = TrickleSource(self.midi_events)
+        self.keyboard_midi = keyboard.AsyncKeyboardMidi(source=self.source, poll_time=0)
+
+    def test_iterate(self):
+        async def collect():
+            return [e async for e in self.keyboard_midi]
+        self.assertEqual(asyncio.run(collect()), self.midi_events)
+        self.assertTrue(self.source.closed)
+        self.assertEqual(self.keyboard_midi.keyboard.keys, {39: []})
+
+    def test_observers(self):
+        observer = Observer()
+        async_observer = AsyncObserver()
+        self.keyboard_midi.watch(observer)
+        self.keyboard_midi.watch_async(async_observer)
+        ticks = []
+
+        async def tick():
+            while self.keyboard_midi.listening or not ticks:
+                ticks.append(1)
+                await asyncio.sleep(0)
+
+        async def main():
+            await asyncio.gather(self.keyboard_midi.listen(), tick())
+        asyncio.run(main())
+        self.assertEqual(len(observer.changes), 3)
+        self.assertEqual([c.pressed for c in async_observer.changes],
+                         [c.pressed for c in observer.changes])
+        self.assertEqual(observer.changes[-1].released, {39})
+        self.assertGreater(len(ticks), 1)
@@ -0,0 +1,97 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import keyboard
+
+
+class TestMixer(unittest.TestCase):
+    def setUp(self):
+        self.mixer = keyboard.Mixer(2)
+        rng = np.random.default_rng(0)
+        self.waves = [rng.uniform(-1, 1, (n, 2)) for n in [100, 250, 40]]
+
+    def expected(self, voices, now):
+        """ Sum every voice the slow way """
+        end = max(begin + wave.shape[0] for begin, wave in voices)
+        total = np.zeros((max(end - now, 0), 2))
+        for begin, wave in voices:
+            if begin + wave.shape[0] <= now:
+                continue
+            first = max(now, begin)
+            total[first-now:begin+wave.shape[0]-now] += wave[first-begin:]
+        return total
+
+    def test_add(self):
+        voices = [(0, self.waves[0]), (30, self.waves[1]), (60, self.waves[2])]
+        for i, (begin, wave) in enumerate(voices):
+            self.mixer.add(i, wave, begin, begin)
+        np.testing.assert_allclose(self.mixer.read(60), self.expected(voices, 60))
+
+    def test_add_late(self):
+        self.mixer.add(0, self.waves[0], 0, 50)
+        np.testing.assert_allclose(self.mixer.read(50), self.waves[0][50:])
+
+    def test_remove(self):
+        self.mixer.add(0, self.waves[0], 0, 0)
+        self.mixer.add(1, self.waves[1], 10, 10)
+        self.mixer.add(2, self.waves[2], 20, 20)
+        self.mixer.remove(1, 40)
+        voices = [(0, self.waves[0]), (20, self.waves[2])]
+        np.testing.assert_allclose(self.mixer.read(40), self.expected(voices, 40))
+        self.assertEqual(len(self.mixer), 2)
+
+    def test_remove_all(self):
+        self.mixer.add(0, self.waves[0], 0, 0)
+        self.mixer.remove(0, 10)
+        self.mixer.remove(0, 10)
+        self.assertEqual(self.mixer.read(10).shape[0], 0)
+
+    def test_reset_keeps_buffer(self):
+        self.mixer.add(0, self.waves[0], 0, 0)
+        buffer = self.mixer.buffer
+        self.mixer.remove(0, 10)
+        self.assertIs(self.mixer.buffer, buffer)
+        self.mixer.add(1, self.waves[2], 10, 10)
+        np.testing.assert_allclose(self.mixer.read(10), self.waves[2])
+
+    def test_float32(self):
+        mixer = keyboard.Mixer(2, np.float32)
+        mixer.add(0, self.waves[0], 0, 0)
+        mixer.add(1, self.waves[1].astype(np.float32), 30, 30)
+        self.assertEqual(mixer.read(30).dtype, np.float32)
+        expected = self.expected([(0, self.waves[0]), (30, self.waves[1])], 30)
+        np.testing.assert_allclose(mixer.read(30), expected, rtol=1e-5, atol=1e-6)
+
+    def test_ended(self):
+        self.mixer.add(0, self.waves[2], 0, 0)
+        self.assertEqual(self.mixer.read(40).shape[0], 0)
+        self.mixer.add(1, self.waves[2], 0, 100)
+        self.assertEqual(self.mixer.read(100).shape[0], 0)
+
+    def test_grow(self):
+        voices = []
+        for i in range(20):
+            begin = i*30
+            wave = self.waves[i % 3]
+            self.mixer.add(i, wave, begin, begin)
+            voices.append((begin, wave))
+        np.testing.assert_allclose(self.mixer.read(570), self.expected(voices, 570))
+        self.assertLess(self.mixer.buffer.shape[0], 600)
+
+    def test_mono(self):
+        wave = self.waves[0][:, :1]
+        self.mixer.add(0, wave, 0, 0)
+        np.testing.assert_allclose(self.mixer.read(0), wave.repeat(2, axis=1))
+
+    def test_add_all(self):
+        voices = [(0, self.waves[0], 10), (1, self.waves[1], 0), (2, self.waves[2], 200)]
+        with ThreadPoolExecutor(3) as executor:
+            self.mixer.add_all(voices, 5, executor, chunks=3)
+        expected = self.expected([(begin, wave) for _, wave, begin in voices], 5)
+        np.testing.assert_allclose(self.mixer.read(5), expected)
+        self.mixer.add_all([(3, self.waves[2], 20)], 20)
+        self.mixer.remove(1, 20)
+        expected = self.expected([(10, self.waves[0]), (200, self.waves[2]), (20, self.waves[2])], 20)
+        np.testing.assert_allclose(self.mixer.read(20), expected)
@@ -11,3 +11,8 @@ class TestModel(unittest.TestCase):
     def test_x(self):
         c4 = 3+12*3
         self.assertTrue(abs(self.keyset.get_freq(c4) - 261.6) < .5)
+
+    def test_time_axis(self):
+        x = keyboard.time_axis(4, 1000, offset=2)
+        self.assertEqual(x.shape, (4, 1))
+        self.assertEqual(list(x[:, 0]), [.002, .003, .004, .005])
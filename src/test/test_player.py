@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+
+import keyboard
+
+
+class TestPlayer(unittest.TestCase):
+    def setUp(self):
+        self.sink = keyboard.RecordingSink(sample_rate=8000)
+        self.player = keyboard.Player(sink=self.sink)
+
+    def test_play_stop(self):
+        note = keyboard.PlayerBasicNote(0, 440, 127)
+        self.player.play(note, 0)
+        ticks, wave = self.sink.waves[-1]
+        self.assertEqual(wave.dtype, np.int16)
+        self.assertEqual(wave.shape, (int(note.get_duration()*8000), 2))
+        self.player.stop(note)
+        self.assertEqual(self.player.notes, {})
+        self.assertIsNone(self.sink.waves[-1][1])
+
+    def test_workers(self):
+        sink = keyboard.NullSink(sample_rate=8000)
+        player = keyboard.Player(sink=sink, workers=4, max_voices=3, bank=keyboard.WaveBank())
+        notes = [keyboard.PlayerBasicNote(i, 220*(i+1), 127) for i in range(5)]
+        player.play_all(notes, [0]*5)
+        self.assertEqual(set(player.notes), set(notes[2:]))
+        self.assertEqual(set(player.mixer.voices), set(notes[2:]))
+        expected = keyboard.Player(sink=keyboard.NullSink(sample_rate=8000))
+        expected.play_all(notes[2:], [0]*3)
+        np.testing.assert_allclose(player.build_wave(0), expected.build_wave(0))
+        player.close()
+
+    def test_chord(self):
+        freqs = [220, 275, 330]
+        chord = keyboard.PlayerChordNote('chord', freqs, 100, duration=.5)
+        x = self.player.sub_x(chord.get_duration())
+        wave = chord.get_wave(x)
+        self.assertEqual(wave.shape, (4000, 1))
+        notes = [keyboard.PlayerBasicNote(f, f, 100) for f in freqs]
+        expected = sum(note.get_wave(x) for note in notes)
+        np.testing.assert_allclose(wave, expected)
+        for note, part in zip(notes, chord.split(x)):
+            np.testing.assert_allclose(part.get_wave(), note.get_wave())
+
+    def test_float32(self):
+        player = keyboard.Player(sink=keyboard.NullSink(sample_rate=8000), dtype=np.float32)
+        for p in [player, self.player]:
+            for i in range(3):
+                p.start(keyboard.PlayerBasicNote(i, 220*(i+1), 127), 0, 0)
+        self.assertEqual(player.mixer.buffer.dtype, np.float32)
+        self.assertEqual(next(iter(player.notes)).get_wave().dtype, np.float32)
+        wave = player.build_sound(0)
+        self.assertEqual(wave.dtype, np.int16)
+        np.testing.assert_allclose(wave, self.player.build_sound(0), atol=2)
+
+    def test_buffers_reused(self):
+        note = keyboard.PlayerBasicNote(0, 440, 127)
+        self.player.play(note, 0)
+        scaled, output = self.player.scaled, self.player.output
+        self.player.stop(note)
+        self.player.play(keyboard.PlayerBasicNote(1, 330, 127), 0)
+        self.assertIs(self.player.scaled, scaled)
+        self.assertIs(self.player.output, output)
+
+    def test_additive(self):
+        x = self.player.sub_x(.1)
+        partials = (1, .5, .25)
+        note = keyboard.PlayerAdditiveNote(0, 440, 127, partials, fade=False, normalize=False,
+                                           sample_rate=self.player.sample_rate)
+        expected = sum(a*np.sin(2*np.pi*440*(k+1)*x) for k, a in enumerate(partials))
+        np.testing.assert_allclose(note.get_wave(x), expected, atol=1e-5)
+
+    def test_additive_band_limited(self):
+        x = self.player.sub_x(.1)
+        note = keyboard.PlayerAdditiveNote(0, 1500, 127, keyboard.SAWTOOTH, fade=False,
+                                           sample_rate=self.player.sample_rate)
+        wave = note.get_wave(x)[:, 0]
+        self.assertLessEqual(np.abs(wave).max(), 1 + 1e-9)
+        spectrum = np.abs(np.fft.rfft(wave[:800]))
+        freqs = np.fft.rfftfreq(800, 1/8000)
+        self.assertGreater(spectrum[freqs == 3000][0], 1)
+        # the third partial would alias to 3500 Hz
+        self.assertLess(spectrum[freqs == 3500][0], 1e-3)
+        # a single sample, like the start of a release, is band limited too
+        np.testing.assert_allclose(note.oscillate(x[5:6], 1500), note.oscillate(x, 1500)[5:6])
+        note = keyboard.PlayerAdditiveNote(1, 1500, 127, keyboard.SAWTOOTH, fade=False)
+        self.player.load(note)
+        self.assertEqual(note.sample_rate, self.player.sample_rate)
+        keyboard_player = keyboard.KeyboardPlayer(None, None, None, partials=keyboard.SQUARE)
+        self.assertIsInstance(keyboard_player.make_note((440, 127, 0)), keyboard.PlayerAdditiveNote)
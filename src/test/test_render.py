@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+import wave
+
+import numpy as np
+
+import keyboard
+
+
+class TestRender(unittest.TestCase):
+    def setUp(self):
+        self.renderer = keyboard.OfflineRenderer(sample_rate=8000)
+
+    def test_single(self):
+        note = keyboard.PlayerBasicNote(1, 440, 127)
+        self.renderer.play(note, 0)
+        out = self.renderer.render(np.float32)
+        self.assertEqual(out.shape, (int(note.get_duration()*8000), 2))
+        self.assertEqual(out.dtype, np.float32)
+        expected = note.get_wave()[:, 0]*self.renderer.volume
+        np.testing.assert_allclose(out[:, 1], expected, atol=1e-6)
+
+    def test_sample_accurate(self):
+        note1 = keyboard.PlayerBasicNote(1, 440, 127, fade=False)
+        note2 = keyboard.PlayerBasicNote(2, 660, 127, fade=False)
+        self.renderer.play(note1, 0)
+        self.renderer.play(note2, 12.5)
+        self.renderer.stop(note1, 100)
+        out = self.renderer.render(np.float32, length=200)
+        self.assertEqual(out.shape[0], 1600)
+        wave1 = note1.get_wave()[:, 0]*self.renderer.volume
+        wave2 = note2.get_wave()[:, 0]*self.renderer.volume
+        np.testing.assert_allclose(out[:100, 0], wave1[:100], atol=1e-6)
+        np.testing.assert_allclose(out[100:800, 0], wave1[100:800] + wave2[:700], atol=1e-6)
+        np.testing.assert_allclose(out[800:, 0], wave2[700:1500], atol=1e-6)
+
+    def test_int16(self):
+        self.renderer.play(keyboard.PlayerBasicNote(1, 440, 127), 0)
+        out = self.renderer.render(length=1000)
+        self.assertEqual(out.dtype, np.int16)
+        self.assertEqual(out.shape, (8000, 2))
+        self.assertGreater(self.renderer.speed, 1)
+
+    def test_write(self):
+        self.renderer.play(keyboard.PlayerBasicNote(1, 440, 127), 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.wav')
+            out = self.renderer.write(path, length=500)
+            with wave.open(path) as f:
+                self.assertEqual(f.getnframes(), 4000)
+                self.assertEqual(f.getnchannels(), 2)
+                frames = np.frombuffer(f.readframes(4000), dtype='<i2')
+            np.testing.assert_array_equal(frames.reshape(-1, 2), out)
+            path = os.path.join(tmp, 'out.npy')
+            self.renderer.write(path, length=500)
+            self.assertEqual(np.load(path).dtype, np.float32)
+
+    def test_workers(self):
+        notes = [keyboard.PlayerBasicNote(i, 220*(i+1), 127) for i in range(6)]
+        for i, note in enumerate(notes):
+            self.renderer.play(note, 0)
+        expected = self.renderer.render(np.float32, length=100)
+        renderer = keyboard.OfflineRenderer(sample_rate=8000, workers=3, bank=keyboard.WaveBank())
+        notes = [keyboard.PlayerBasicNote(i, 220*(i+1), 127) for i in range(6)]
+        notes.append(keyboard.PlayerBasicNote(6, 220, 127))
+        for note in notes:
+            renderer.play(note, 0)
+        renderer.stop(notes[-1], 0)
+        np.testing.assert_allclose(renderer.render(np.float32, length=100), expected, atol=1e-6)
+        self.assertEqual(len(renderer.bank), 6)
@@ -0,0 +1,151 @@
+import os
+import struct
+
+import numpy as np
+
+import keyboard
+from . import FakePlayer, TempDirTestCase
+
+
+def wav_file(samples, sample_rate=1000, tag=1, extra=b''):
+    """ A wav file of a (frames, channels) array, with extra chunks before its data """
+    data = samples.tobytes()
+    channels = samples.shape[1]
+    bits = samples.dtype.itemsize*8
+    block_align = channels*samples.dtype.itemsize
+    fmt = struct.pack('<HHIIHH', tag, channels, sample_rate, sample_rate*block_align,
+                      block_align, bits)
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + extra
+    body += b'data' + struct.pack('<I', len(data)) + data
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+class TestSampler(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.keys = keyboard.KeySetBuilder().build()
+        self.ramp = (np.arange(200, dtype=np.int16)*100).reshape(-1, 1)
+
+    def test_map_wav(self):
+        # an odd sized chunk before the data has to be skipped with its padding
+        path = self.write('a.wav', wav_file(self.ramp, extra=b'LIST' + struct.pack('<I', 3) + b'abc\0'))
+        data, sample_rate = keyboard.map_wav(path)
+        self.assertIsInstance(data, np.memmap)
+        self.assertEqual(sample_rate, 1000)
+        np.testing.assert_array_equal(data, self.ramp)
+
+        stereo = np.ones((10, 2), dtype=np.float32)
+        path = self.write('b.wav', wav_file(stereo, tag=3))
+        np.testing.assert_array_equal(keyboard.map_wav(path)[0], stereo)
+        with self.assertRaises(ValueError):
+            keyboard.map_wav(self.write('c.wav', b'RIFF\0\0\0\0WAVE'))
+
+    def test_root_zero_copy(self):
+        wave = np.linspace(-1, 1, 100, dtype=np.float32).reshape(-1, 1)
+        sample = keyboard.Sample(self.write('a.wav', wav_file(wave, tag=3)), 48)
+        sampler = keyboard.Sampler([sample], self.keys, 1000, dtype=np.float32)
+        note = sampler.make_note(1, self.keys.get_freq(48), 100)
+        player = FakePlayer()
+        player.dtype = np.dtype(np.float32)
+        bank = keyboard.WaveBank()
+        played = bank.load(note, player)
+        self.assertTrue(np.shares_memory(played, sample.data))
+        np.testing.assert_array_equal(played, wave)
+        self.assertEqual(len(bank), 0)
+
+    def test_root_converted(self):
+        # int samples played as floats are scaled, and banked as they are no view
+        sample = keyboard.Sample(self.write('a.wav', wav_file(self.ramp)), 48)
+        note = keyboard.Sampler([sample], self.keys, 1000).make_note(1, self.keys.get_freq(48), 100)
+        self.assertIsNotNone(note.get_wave_key())
+        played = keyboard.WaveBank().load(note, FakePlayer())
+        self.assertFalse(np.shares_memory(played, sample.data))
+        np.testing.assert_allclose(played[:, 0], self.ramp[:, 0]/2**15)
+
+    def test_wave_key_follows_file(self):
+        path = self.write('a.wav', wav_file(self.ramp))
+        sample = keyboard.Sample(path, 48, 36, 60)
+        key = keyboard.Sampler([sample], self.keys, 1000).make_note(1, 440*2, 100).get_wave_key()
+        self.write('a.wav', wav_file(self.ramp[:100]))
+        sample = keyboard.Sample(path, 48, 36, 60)
+        other = keyboard.Sampler([sample], self.keys, 1000).make_note(1, 440*2, 100).get_wave_key()
+        self.assertNotEqual(key, other)
+
+    def test_shifted(self):
+        sample = keyboard.Sample(self.write('a.wav', wav_file(self.ramp)), 48, 36, 60)
+        sampler = keyboard.Sampler([sample], self.keys, 1000)
+        note = sampler.make_note(1, self.keys.get_freq(60), 100)
+        self.assertAlmostEqual(note.step, 2)
+        wave = note.get_wave(FakePlayer().sub_x(note.get_duration()))
+        np.testing.assert_allclose(wave[:, 0], self.ramp[::2, 0]/2**15)
+
+        note = sampler.make_note(2, self.keys.get_freq(36), 100)
+        wave = note.get_wave(FakePlayer().sub_x(note.get_duration()))
+        self.assertEqual(wave.shape[0], 399)
+        np.testing.assert_allclose(wave[1::2, 0], (self.ramp[:-1, 0] + 50)/2**15)
+
+        # tables are shared by notes shifted the same
+        table = keyboard.resample_table(note.step, 399)
+        self.assertIs(keyboard.resample_table(note.step, 399), table)
+
+    def test_layers(self):
+        soft = keyboard.Sample(self.write('soft.wav', wav_file(self.ramp)), 48, 40, 55, 0, 63)
+        loud = keyboard.Sample(self.write('loud.wav', wav_file(self.ramp)), 48, 40, 55, 64, 127)
+        high = keyboard.Sample(self.write('high.wav', wav_file(self.ramp)), 60, 56, 70)
+        sampler = keyboard.Sampler([soft, loud, high], self.keys, 1000)
+        self.assertEqual(sampler.find(self.keys.get_freq(50), 30), 0)
+        self.assertEqual(sampler.find(self.keys.get_freq(50), 100), 1)
+        self.assertEqual(sampler.find(self.keys.get_freq(58), 100), 2)
+        self.assertEqual(sampler.find(self.keys.get_freq(80), 30), 2)
+        self.assertEqual(sampler.find(self.keys.get_freq(20), 100), 1)
+
+    def test_layers_not_quantized(self):
+        # a bank rounds velocities into buckets, which must not move them across layers
+        soft = keyboard.Sample(self.write('soft.wav', wav_file(self.ramp)), 48, 0, 87, 0, 50)
+        loud = keyboard.Sample(self.write('loud.wav', wav_file(self.ramp)), 48, 0, 87, 51, 127)
+        sampler = keyboard.Sampler([soft, loud], self.keys, 1000)
+        player = keyboard.Player(bank=keyboard.WaveBank(), sink=keyboard.NullSink())
+        keyboard_player = keyboard.KeyboardPlayer(None, player, self.keys, sampler=sampler)
+        note = keyboard_player.make_note(keyboard_player.make_note_id(48, 49, 0))
+        self.assertIs(note.sample, soft)
+        note = keyboard_player.make_note(keyboard_player.make_note_id(48, 51, 0))
+        self.assertIs(note.sample, loud)
+        sequencer = keyboard.Sequencer(None, self.keys, sampler=sampler)
+        sequencer.schedule(keyboard.make_score([(0, 100, 48, 49)]), 0)
+        self.assertIs(sequencer.make_note(0, keyboard.WaveBank()).sample, soft)
+
+    def test_release(self):
+        sample = keyboard.Sample(self.write('a.wav', wav_file(self.ramp)), 48)
+        envelope = keyboard.Envelope(release=.01)
+        note = keyboard.Sampler([sample], self.keys, 1000).make_note(1, 440, 100, envelope)
+        note.get_wave(FakePlayer().sub_x(note.get_duration()))
+        self.assertAlmostEqual(note.get_release_time(.1), envelope.get_release_time(1))
+        self.assertAlmostEqual(note.get_release_time(.19), .01)
+        x = FakePlayer().sub_x(.02, 100)
+        tail = note.get_release(x, .1)
+        np.testing.assert_allclose(tail[:, 0], self.ramp[100:120, 0]/2**15*np.exp(-np.arange(20)/10))
+
+    def test_read_sample_map(self):
+        path = self.write('samples.txt', b'# piano\n'
+                                         b'a.wav A4\n'
+                                         b'b.wav 60 56 70 # high\n'
+                                         b'c.wav C4 30 45 0 63\n')
+        samples = keyboard.read_sample_map(path)
+        self.assertEqual([(s.root, s.low, s.high, s.low_velocity, s.high_velocity) for s in samples],
+                         [(48, 48, 48, 0, 127), (60, 56, 70, 0, 127), (39, 30, 45, 0, 63)])
+        self.assertEqual(samples[0].path, os.path.join(self.dir.name, 'a.wav'))
+        with self.assertRaises(ValueError):
+            keyboard.read_sample_map(self.write('bad.txt', b'a.wav 1 2\n'))
+
+    def test_keyboard_player(self):
+        sample = keyboard.Sample(self.write('a.wav', wav_file(self.ramp)), 48, 0, 87)
+        sampler = keyboard.Sampler([sample], self.keys, 1000)
+        sink = keyboard.RecordingSink(1000, 2)
+        player = keyboard.Player(bank=keyboard.WaveBank(), sink=sink)
+        board = keyboard.Keyboard()
+        keyboard_player = keyboard.KeyboardPlayer(board, player, self.keys, sampler=sampler)
+        board.press(48, 127, 0)
+        keyboard_player.update(board)
+        self.assertIsInstance(next(iter(keyboard_player.playing.values())), keyboard.PlayerSampledNote)
+        _, wave = sink.waves[-1]
+        self.assertGreater(np.abs(wave).max(), 0)
@@ -0,0 +1,102 @@
+import struct
+import unittest
+
+import numpy as np
+
+import keyboard
+from . import TempDirTestCase
+
+
+def varlen(value):
+    out = [value & 0x7f]
+    value >>= 7
+    while value:
+        out.insert(0, (value & 0x7f) | 0x80)
+        value >>= 7
+    return bytes(out)
+
+
+def midi_file(tracks, division=480):
+    """ A format 1 file of tracks of (delta, message bytes) """
+    data = b'MThd' + struct.pack('>IHHH', 6, 1, len(tracks), division)
+    for events in tracks:
+        chunk = b''.join(varlen(delta) + message for delta, message in events)
+        data += b'MTrk' + struct.pack('>I', len(chunk)) + chunk
+    return data
+
+
+class TestScore(TempDirTestCase):
+    def test_read_score(self):
+        path = self.write('score.txt', b'# a score\n500 250 E4 90\n0 500 C4\n\n1000 10 48  # A4\n')
+        score = keyboard.load_score(path)
+        self.assertEqual(score['time'].tolist(), [0, 500, 1000])
+        self.assertEqual(score['key'].tolist(), [39, 43, 48])
+        self.assertEqual(score['velocity'].tolist(), [100, 90, 100])
+        self.assertEqual(score['duration'].tolist(), [500, 250, 10])
+
+    def test_bad_score(self):
+        path = self.write('bad.txt', b'0 C4\n')
+        with self.assertRaises(ValueError):
+            keyboard.load_score(path)
+
+    def test_read_midi_file(self):
+        tempo = b'\xff\x51\x03' + (250000).to_bytes(3, 'big')  # 240 bpm
+        conductor = [(0, b'\xff\x51\x03' + (500000).to_bytes(3, 'big')),
+                     (960, tempo), (0, b'\xff\x2f\x00')]
+        notes = [
+            (0, b'\xc0\x05'),  # program change, one data byte
+            (0, b'\x90\x3c\x64'),  # C4 on
+            (480, b'\x40\x50'),  # running status, E4 on
+            (480, b'\x3c\x00'),  # C4 off as a zero velocity on
+            (0, b'\xf0\x02\x01\xf7'),  # sysex
+            (480, b'\x80\x40\x00'),  # E4 off
+            (0, b'\x91\x45\x7f'),  # A4 on, never let go of
+            (480, b'\xff\x2f\x00'),
+        ]
+        path = self.write('song.mid', midi_file([conductor, notes]))
+        score = keyboard.load_score(path)
+        self.assertEqual(score['key'].tolist(), [39, 43, 48])
+        np.testing.assert_allclose(score['time'], [0, 500, 1250])
+        np.testing.assert_allclose(score['duration'], [1000, 750, 250])
+        self.assertEqual(score['velocity'].tolist(), [100, 80, 127])
+
+    def test_not_midi(self):
+        path = self.write('bad.mid', b'RIFF')
+        with self.assertRaises(ValueError):
+            keyboard.load_score(path)
+
+
+class TestSequencer(unittest.TestCase):
+    def setUp(self):
+        self.keys = keyboard.KeySetBuilder().build()
+        self.score = keyboard.make_score([(12.5, 100, 48, 127), (50, 100, 60, 127),
+                                          (300, 100, 200, 127)])
+
+    def test_render(self):
+        renderer = keyboard.OfflineRenderer(sample_rate=8000)
+        sequencer = keyboard.Sequencer(None, self.keys)
+        sequencer.render(self.score, renderer)
+        out = renderer.render(np.float32)
+        self.assertTrue(np.all(out[:100] == 0))
+        self.assertNotEqual(out[101, 0], 0)
+        self.assertEqual(out.shape[0], 150*8)
+
+    def test_tick(self):
+        player = keyboard.Player(sink=keyboard.NullSink(sample_rate=8000))
+        sequencer = keyboard.Sequencer(player, self.keys, lookahead=50)
+        sequencer.schedule(self.score, 1000)
+        self.assertFalse(sequencer.tick(900))
+        self.assertTrue(sequencer.tick(970))
+        self.assertEqual(list(player.notes.values()), [1012.5])
+        first = sequencer.notes[0]
+        self.assertEqual(player.mixer.voices[first][0], 8100)
+        self.assertFalse(sequencer.tick(990))
+        self.assertTrue(sequencer.tick(1010))
+        self.assertEqual(sorted(player.notes.values()), [1012.5, 1050])
+        self.assertTrue(sequencer.tick(1070))
+        self.assertEqual(list(player.notes.values()), [1050])
+        self.assertNotIn(first, player.mixer)
+        self.assertFalse(sequencer.done())
+        sequencer.tick(1400)
+        self.assertTrue(sequencer.done())
+        self.assertEqual(player.notes, {})
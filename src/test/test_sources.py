@@ -0,0 +1,145 @@
+import os
+import tempfile
+import unittest
+
+import keyboard
+
+
+class ListSource(keyboard.MidiSource):
+    def __init__(self, midi_events):
+        self.midi_events = list(midi_events)
+        self.closed = False
+
+    def poll(self):
+        return len(self.midi_events) > 0
+
+    def read(self, count):
+        midi_events = self.midi_events[:count]
+        self.midi_events = self.midi_events[count:]
+        return midi_events
+
+    def time(self):
+        return 0
+
+    def done(self):
+        return not self.poll()
+
+    def close(self):
+        self.closed = True
+
+
+class TestSources(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'capture.kmid')
+        self.events = [
+            [[144, 60, 100, 0], 1000],
+            [[176, 64, 127, 0], 1010],
+            [[128, 60, 0, 0], 1020],
+            [[176, 64, 0, 0], 1500],
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_load(self):
+        keyboard.save_events(self.path, self.events)
+        self.assertEqual(os.path.getsize(self.path), len(keyboard.MAGIC) + 8*len(self.events))
+        self.assertEqual(keyboard.unpack_events(keyboard.load_events(self.path)), self.events)
+
+    def test_bad_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'MThd')
+        self.assertRaises(ValueError, lambda: keyboard.load_events(self.path))
+
+    def test_record(self):
+        source = keyboard.RecordingSource(ListSource(self.events), self.path)
+        while source.poll():
+            source.read(3)
+        source.close()
+        self.assertTrue(source.source.closed)
+        self.assertEqual(source.count, 4)
+        self.assertEqual(keyboard.unpack_events(keyboard.load_events(self.path)), self.events)
+
+    def test_replay_max_speed(self):
+        keyboard.save_events(self.path, self.events)
+        source = keyboard.ReplaySource(self.path, speed=None, clock=lambda: 7)
+        self.assertTrue(source.poll())
+        midi_events = source.read(10)
+        self.assertEqual([e[0] for e in midi_events], [e[0] for e in self.events])
+        self.assertEqual({e[1] for e in midi_events}, {7})
+        self.assertTrue(source.done())
+
+    def test_replay_speed(self):
+        keyboard.save_events(self.path, self.events)
+        now = [100]
+        source = keyboard.ReplaySource(self.path, speed=2, clock=lambda: now[0])
+        self.assertEqual(len(source.read(10)), 1)
+        now[0] = 110
+        self.assertEqual([e[1] for e in source.read(10)], [105, 110])
+        self.assertFalse(source.poll())
+        now[0] = 400
+        self.assertEqual([e[1] for e in source.read(10)], [350])
+        self.assertTrue(source.done())
+
+
+class TestMergedSource(unittest.TestCase):
+    def setUp(self):
+        self.keys = ListSource([[[144, 60, 100, 0], 10], [[128, 60, 0, 0], 30],
+                                [[144, 62, 100, 0], 50]])
+        self.pedal = ListSource([[[176, 64, 127, 0], 20], [[176, 64, 0, 0], 40]])
+        self.source = keyboard.MergedSource([self.keys, self.pedal], ['keys', 'pedal'])
+
+    def test_order(self):
+        self.assertTrue(self.source.poll())
+        self.assertEqual([e[1] for e in self.source.read(2)], [10, 20])
+        self.assertEqual(self.source.pending, [2, 1])
+        self.assertFalse(self.source.done())
+        self.assertEqual([e[1] for e in self.source.read(10)], [30, 40, 50])
+        self.assertEqual(self.source.events, [3, 2])
+        self.assertEqual(self.source.pending, [0, 0])
+        self.assertTrue(self.source.done())
+        self.source.close()
+        self.assertTrue(self.keys.closed and self.pedal.closed)
+
+    def test_lags(self):
+        self.source.time = lambda: 45
+        self.source.read(10)
+        self.assertEqual(list(self.source.lags[0]), [35, 15, 0])
+        self.assertEqual(list(self.source.lags[1]), [25, 5])
+        lines = self.source.report().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[2].startswith('pedal'))
+
+    def test_keyboard_midi(self):
+        keyboard_midi = keyboard.KeyboardMidi(wait_time=None, source=self.source)
+        keyboard_midi.listen()
+        self.assertEqual(keyboard_midi.delayed, 0)
+        self.assertIsNone(keyboard_midi.keyboard.sustain)
+        self.assertEqual(keyboard_midi.keyboard.keys[39], [])
+        self.assertEqual(keyboard_midi.keyboard.keys[41], [(100, 50)])
+        self.assertTrue(self.keys.closed)
+
+
+class TestPipeline(unittest.TestCase):
+    def test_headless(self):
+        midi_events = []
+        for i in range(50):
+            midi_events.append([[144, 21 + i, 100, 0], i*10])
+            midi_events.append([[128, 21 + i, 0, 0], i*10 + 25])
+        midi_events.append([[144, 60, 100, 0], 1000])
+        sink = keyboard.RecordingSink(sample_rate=8000)
+        player = keyboard.Player(sink=sink, max_voices=8, stats=keyboard.LatencyStats())
+        keyboard_midi = keyboard.KeyboardMidi(wait_time=None, source=ListSource(midi_events),
+                                              batch_size=16, stats=player.stats)
+        keyboard_player = keyboard.KeyboardPlayer(keyboard_midi, player,
+                                                  keyboard.KeySetBuilder().build())
+        keyboard_player.run()
+        self.assertTrue(keyboard_midi.source.closed)
+        self.assertEqual(len(player.notes), 1)
+        self.assertEqual(sink.outputs, len(sink.waves))
+        self.assertGreater(sink.outputs, 0)
+        ticks, wave = sink.waves[-1]
+        self.assertEqual(wave.shape[1], 2)
+        self.assertGreater(player.stats.percentiles('synth')['count'], 0)
+        self.assertGreater(player.stats.percentiles('read')['count'], 0)
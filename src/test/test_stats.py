@@ -0,0 +1,133 @@
+import json
+import os
+import pstats
+import unittest
+
+import keyboard
+from . import TempDirTestCase
+
+
+class TestLatencyStats(unittest.TestCase):
+    def setUp(self):
+        self.stats = keyboard.LatencyStats(window=3)
+
+    def test_laps(self):
+        self.stats.begin(wait=.5)
+        self.stats.lap('synth')
+        self.stats.lap('mix')
+        self.stats.lap('mix')
+        self.stats.end()
+        summary = self.stats.summary()
+        self.assertEqual(summary['synth']['count'], 1)
+        self.assertEqual(summary['mix']['count'], 1)
+        self.assertEqual(summary['play']['count'], 0)
+        self.assertIsNone(summary['play']['p50'])
+        self.assertGreaterEqual(summary['total']['p50'], .5)
+
+    def test_idle(self):
+        self.stats.lap('mix')
+        self.stats.end()
+        self.assertEqual(self.stats.summary()['total']['count'], 0)
+
+    def test_percentiles(self):
+        for seconds in [1, 2, 3, 4]:
+            self.stats.record('wait', seconds)
+        result = self.stats.percentiles('wait')
+        self.assertEqual(result['count'], 3)
+        self.assertEqual(result['p50'], 3)
+        self.assertAlmostEqual(result['p99'], 3.98)
+
+    def test_report(self):
+        self.stats.record('update', .002)
+        lines = self.stats.report().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('update'))
+
+    def test_keyboard_player(self):
+        from .test_keyboard import RecordingPlayer
+        board = keyboard.Keyboard()
+        player = keyboard.KeyboardPlayer(board, RecordingPlayer(),
+                                         keyboard.KeySetBuilder().build(), stats=self.stats)
+        board.watch(player)
+        self.stats.begin()
+        board.press(40, 100, 0)
+        board.notify()
+        self.stats.end()
+        self.assertEqual(self.stats.percentiles('update')['count'], 1)
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.stats = keyboard.LatencyStats()
+        self.tracer = keyboard.Tracer(self.stats)
+
+    def test_spans(self):
+        self.tracer.lap('mix')
+        self.tracer.begin(wait=.1)
+        self.tracer.record('wait', .1)
+        self.tracer.record('read', .001)
+        self.tracer.lap('synth')
+        self.tracer.lap('mix')
+        self.tracer.end()
+        self.assertEqual([span[0] for span in self.tracer.spans], ['read', 'synth', 'mix'])
+        _, start, seconds, _ = self.tracer.spans[1]
+        self.assertAlmostEqual(self.tracer.spans[2][1], start + seconds)
+        self.assertEqual(self.stats.percentiles('mix')['count'], 1)
+        self.assertEqual(self.stats.percentiles('total')['count'], 1)
+
+    def test_record_started(self):
+        self.tracer.begin()
+        self.tracer.record('read', .5, self.tracer.mark - .5)
+        self.tracer.lap('update')
+        _, start, seconds, _ = self.tracer.spans[0]
+        self.assertLessEqual(start + seconds, self.tracer.spans[1][1])
+
+    def test_toggle(self):
+        self.tracer.toggle()
+        self.tracer.begin()
+        self.tracer.lap('synth')
+        self.tracer.end()
+        self.assertEqual(len(self.tracer.spans), 0)
+        self.assertEqual(self.stats.percentiles('synth')['count'], 1)
+        self.tracer.toggle()
+        self.tracer.begin()
+        self.tracer.lap('synth')
+        self.assertEqual(len(self.tracer.spans), 1)
+
+    def test_chrome_trace(self):
+        self.tracer.begin()
+        self.tracer.lap('update')
+        events = self.tracer.chrome_trace()['traceEvents']
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['name'], 'update')
+        self.assertEqual(events[0]['ph'], 'X')
+        self.assertGreaterEqual(events[0]['dur'], 0)
+
+
+class TestProfile(TempDirTestCase):
+    def play(self, profile):
+        sink = keyboard.NullSink(sample_rate=8000)
+        player = keyboard.Player(sink=sink, stats=profile.get_stats())
+        profile.start()
+        stats = profile.get_stats()
+        if stats is not None:
+            stats.begin()
+        player.play(keyboard.PlayerBasicNote(1, 440, 100), 0)
+        profile.close()
+
+    def test_chrome_trace(self):
+        path = os.path.join(self.dir.name, 'session.json')
+        profile = keyboard.Profile(path)
+        self.assertIsInstance(profile.get_stats(), keyboard.Tracer)
+        self.play(profile)
+        with open(path) as f:
+            names = {event['name'] for event in json.load(f)['traceEvents']}
+        self.assertEqual(names, {'synth', 'mix', 'convert', 'play'})
+
+    def test_pstats(self):
+        path = os.path.join(self.dir.name, 'session.prof')
+        profile = keyboard.Profile(path)
+        self.assertIsNone(profile.get_stats())
+        self.play(profile)
+        functions = [name for _, _, name in pstats.Stats(path).stats]
+        self.assertIn('build_sound', functions)
@@ -134,3 +134,29 @@ class TestModel(unittest.TestCase):
             note = keyboard.Note('C{}4'.format(value))
             accidental = note.get_note()[1]
             self.assertEqual(accidental, expected)
+
+    def test_keys_from_names(self):
+        names = ['A0', 'C4', 'cb4', 'G###nn-2', 'C#4', 'Db4']
+        keys = keyboard.Note.keys_from_names(names)
+        self.assertEqual(keys.dtype.kind, 'i')
+        self.assertEqual(keys.tolist(), [keyboard.Note(name).get_key() for name in names])
+        self.assertRaises(ValueError, lambda: keyboard.Note.keys_from_names(['C4', 'H4']))
+
+    def test_names_from_keys(self):
+        keys = list(range(-12, 100))
+        names = keyboard.Note.names_from_keys(keys)
+        self.assertEqual(names, [str(keyboard.Note(key)) for key in keys])
+        names = keyboard.Note.names_from_keys(keys, use_flats=True)
+        self.assertEqual(names, [str(keyboard.Note(key, use_flats=True)) for key in keys])
+        self.assertEqual(keyboard.Note.keys_from_names(names).tolist(), keys)
+
+    def test_parse_many(self):
+        notes = keyboard.Note.parse_many(['C4', 'Db4'], use_flats=True)
+        self.assertEqual([note.get_key() for note in notes], [39, 40])
+        self.assertTrue(notes[0].use_flats)
+
+    def test_parse_cached(self):
+        keyboard.Note('E#7')
+        hits = keyboard.Note.parse_name.cache_info().hits
+        keyboard.Note('E#7')
+        self.assertEqual(keyboard.Note.parse_name.cache_info().hits, hits + 1)
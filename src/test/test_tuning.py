@@ -0,0 +1,77 @@
+import numpy as np
+
+import keyboard
+from . import TempDirTestCase
+
+
+class TestTuning(TempDirTestCase):
+    def test_standard(self):
+        keyset = keyboard.KeySet()
+        self.assertEqual(len(keyset.keys), 88)
+        self.assertAlmostEqual(keyset.get_freq(48), 440)
+        self.assertAlmostEqual(keyset.get_freq(0), 27.5)
+
+    def test_get_freqs(self):
+        keyset = keyboard.KeySetBuilder().build()
+        keys = [0, 39, 48, 87]
+        freqs = keyset.get_freqs(keys)
+        self.assertEqual([keyset.get_freq(k) for k in keys], list(freqs))
+        self.assertEqual(len(keyset.get_freqs([])), 0)
+        builder = keyboard.KeySetBuilder()
+        for key in keys:
+            self.assertAlmostEqual(builder.get_freq(key), 440*2**((key-48)/12))
+
+    def test_cached(self):
+        a = keyboard.KeySetBuilder(432).build_keys()
+        b = keyboard.KeySetBuilder(432).build_keys()
+        self.assertIs(a, b)
+        self.assertFalse(a.flags.writeable)
+
+    def test_tables_bounded(self):
+        for root in range(keyboard.KeySetBuilder.max_tables + 10):
+            keyboard.KeySetBuilder(300 + root).build_keys()
+        self.assertLessEqual(len(keyboard.KeySetBuilder.tables), keyboard.KeySetBuilder.max_tables)
+
+    def test_edo(self):
+        builder = keyboard.KeySetBuilder(tuning=keyboard.EdoTuning(19))
+        self.assertAlmostEqual(builder.get_freq(48+19), 880)
+        self.assertAlmostEqual(builder.get_freq(48+1), 440*2**(1/19))
+
+    def test_just(self):
+        tuning = keyboard.RatioTuning(['1', '9/8', '5/4', '4/3', '3/2', '5/3', '15/8'])
+        builder = keyboard.KeySetBuilder(tuning=tuning)
+        self.assertAlmostEqual(builder.get_freq(50), 550)
+        self.assertAlmostEqual(builder.get_freq(55), 880)
+        self.assertAlmostEqual(builder.get_freq(47), 440*15/16)
+
+    def test_retune(self):
+        keyset = keyboard.KeySetBuilder().build()
+        keyset.retune(keyboard.KeySetBuilder(415))
+        self.assertAlmostEqual(keyset.get_freq(48), 415)
+
+    def test_scala(self):
+        scl = self.write('just.scl', '! just.scl\n!\nC major, just\n 7\n!\n'
+                                     ' 9/8\n 5/4\n 4/3\n 701.955 fifth\n 5/3\n 15/8\n 2/1\n')
+        kbm = self.write('white.kbm', '! white keys only\n12\n0\n127\n60\n69\n440.0\n7\n'
+                                      '0\nx\n1\nx\n2\n3\nx\n4\nx\n5\nx\n6\n')
+        builder = keyboard.KeySetBuilder.from_scala(scl, kbm)
+        freqs = builder.build().get_freqs(np.arange(39, 52))
+        c4 = 440*3/5
+        self.assertAlmostEqual(freqs[0], c4)  # C4
+        self.assertTrue(np.isnan(freqs[1]))  # C#4
+        self.assertAlmostEqual(freqs[2], c4*9/8)  # D4
+        self.assertAlmostEqual(freqs[7], c4*1.5, places=3)  # G4
+        self.assertAlmostEqual(freqs[9], 440)  # A4
+        self.assertAlmostEqual(freqs[12], c4*2)  # C5
+
+    def test_scala_without_mapping(self):
+        scl = self.write('edo.scl', 'five\n5\n240.\n480.\n720.\n960.\n1200.\n')
+        builder = keyboard.KeySetBuilder.from_scala(scl)
+        self.assertAlmostEqual(builder.get_freq(53), 880)
+        self.assertAlmostEqual(builder.get_freq(49), 440*2**(1/5))
+
+    def test_unmapped_keys_are_silent(self):
+        mapping = keyboard.KeyMapping([0, None], middle=48, reference_key=48)
+        keyset = keyboard.KeySetBuilder(tuning=keyboard.EdoTuning(1), mapping=mapping).build()
+        player = keyboard.KeyboardPlayer(None, None, keyset)
+        self.assertIsNone(player.make_note_id(49, 100, 0))
@@ -0,0 +1,67 @@
+import unittest
+
+import keyboard
+
+
+class TestVoicePool(unittest.TestCase):
+    def setUp(self):
+        self.notes = [keyboard.PlayerBasicNote(i, 440, 127) for i in range(4)]
+
+    def test_free(self):
+        pool = keyboard.VoicePool(2)
+        self.assertIsNone(pool.acquire(self.notes[0], 0))
+        self.assertIsNone(pool.acquire(self.notes[1], 10))
+        self.assertEqual(len(pool), 2)
+        pool.release(self.notes[0])
+        self.assertIsNone(pool.acquire(self.notes[2], 20))
+        self.assertEqual(pool.stolen, 0)
+
+    def test_steal_oldest(self):
+        pool = keyboard.VoicePool(2)
+        pool.acquire(self.notes[0], 10)
+        pool.acquire(self.notes[1], 0)
+        self.assertIs(pool.acquire(self.notes[2], 20), self.notes[1])
+        self.assertIs(pool.acquire(self.notes[3], 30), self.notes[0])
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(pool.stolen, 2)
+        self.assertNotIn(self.notes[0], pool)
+
+    def test_steal_quietest(self):
+        pool = keyboard.VoicePool(2, steal='quietest')
+        loud = keyboard.PlayerBasicNote('loud', 440, 127, fade=False)
+        quiet = keyboard.PlayerBasicNote('quiet', 440, 20, fade=False)
+        pool.acquire(loud, 0)
+        pool.acquire(quiet, 100)
+        self.assertIs(pool.acquire(self.notes[0], 200), quiet)
+        faded = keyboard.PlayerBasicNote('faded', 440, 127)
+        pool = keyboard.VoicePool(2, steal='quietest')
+        pool.acquire(faded, 0)
+        pool.acquire(quiet, 100)
+        self.assertIs(pool.acquire(self.notes[0], 3000), faded)
+
+    def test_steal_quietest_plain_notes(self):
+        pool = keyboard.VoicePool(1, steal='quietest')
+        note = keyboard.PlayerNote('plain', 1, None, None)
+        pool.acquire(note, 0)
+        self.assertIs(pool.acquire(self.notes[0], 10), note)
+
+    def test_reacquire(self):
+        pool = keyboard.VoicePool(1)
+        pool.acquire(self.notes[0], 0)
+        self.assertIsNone(pool.acquire(self.notes[0], 10))
+        self.assertEqual(len(pool.voices), 1)
+
+    def test_bad_args(self):
+        self.assertRaises(ValueError, lambda: keyboard.VoicePool(0))
+        self.assertRaises(ValueError, lambda: keyboard.VoicePool(4, steal='newest'))
+
+    def test_render(self):
+        renderer = keyboard.OfflineRenderer(sample_rate=1000, max_voices=2)
+        for i, note in enumerate(self.notes):
+            renderer.play(note, i*10)
+        out = renderer.render(length=100)
+        expected = keyboard.OfflineRenderer(sample_rate=1000)
+        expected.play(self.notes[2], 20)
+        expected.play(self.notes[3], 30)
+        diff = out[40:].astype(int) - expected.render(length=100)[40:]
+        self.assertLessEqual(abs(diff).max(), 1)
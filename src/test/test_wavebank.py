@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+import keyboard
+from . import FakePlayer
+
+
+class TestWaveBank(unittest.TestCase):
+    def setUp(self):
+        self.player = FakePlayer()
+        self.bank = keyboard.WaveBank()
+
+    def test_shared(self):
+        note1 = keyboard.PlayerBasicNote(1, 440, 127)
+        note2 = keyboard.PlayerBasicNote(2, 440, 127)
+        wave1 = self.bank.load(note1, self.player)
+        wave2 = self.bank.load(note2, self.player)
+        self.assertIs(wave1, wave2)
+        self.assertIs(note2.get_wave(), wave1)
+        self.assertEqual(self.bank.hits, 1)
+        self.assertEqual(self.bank.misses, 1)
+        self.assertFalse(wave1.flags.writeable)
+
+    def test_distinct(self):
+        self.bank.load(keyboard.PlayerBasicNote(1, 440, 127), self.player)
+        self.bank.load(keyboard.PlayerBasicNote(2, 440, 127, fade=False), self.player)
+        self.bank.load(keyboard.PlayerBasicNote(3, 440, 63), self.player)
+        self.bank.load(keyboard.PlayerBasicNote(4, 220, 127), self.player)
+        self.assertEqual(len(self.bank), 4)
+
+    def test_matches_unbanked(self):
+        note = keyboard.PlayerBasicNote(1, 440, 100)
+        expected = keyboard.PlayerBasicNote(2, 440, 100)
+        expected = expected.get_wave(self.player.sub_x(expected.get_duration()))
+        np.testing.assert_array_equal(self.bank.load(note, self.player), expected)
+
+    def test_eviction(self):
+        wave_bytes = int(keyboard.PlayerBasicNote(0, 100, 127).get_duration()*self.player.sample_rate)*8
+        bank = keyboard.WaveBank(max_bytes=2*wave_bytes)
+        for i, freq in enumerate([100, 200, 300]):
+            bank.load(keyboard.PlayerBasicNote(i, freq, 127), self.player)
+        self.assertEqual(len(bank), 2)
+        self.assertLessEqual(bank.size, bank.max_bytes)
+        key = self.bank.get_key(keyboard.PlayerBasicNote(0, 100, 127), self.player)
+        self.assertNotIn(key, bank)
+
+    def test_quantize(self):
+        self.assertEqual(self.bank.quantize(127), 127)
+        self.assertEqual(self.bank.quantize(0), 0)
+        self.assertEqual(self.bank.quantize(1), 7)
+        self.assertEqual(self.bank.quantize(1), self.bank.quantize(7))
+        self.assertNotEqual(self.bank.quantize(7), self.bank.quantize(8))
+
+    def test_warm_up(self):
+        keyset = keyboard.KeySetBuilder().build()
+        self.bank.warm_up(keyset, self.player)
+        self.assertEqual(len(self.bank), 88)
+        note = keyboard.PlayerBasicNote(0, keyset.get_freq(40), 127)
+        self.bank.load(note, self.player)
+        self.assertEqual(self.bank.hits, 1)